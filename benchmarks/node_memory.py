@@ -0,0 +1,88 @@
+"""Memory and access time of a Blueprint against the plain dicts it is
+built from, on a config with many small mappings that share their keys,
+eg. per class settings.
+
+Blueprint nodes set their entries one by one, so on CPython 3.11+ all
+nodes with the same keys share a single key table and keep their values
+inline, which makes them smaller than the equivalent dicts.
+
+    python benchmarks/node_memory.py --classes 100000
+"""
+import gc
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from copy import deepcopy
+
+try:
+    import mlconf
+except ImportError:
+    # run from a checkout without installing: use the mlconf next to us
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mlconf
+
+
+def make_config(classes):
+    return {'classes': dict(('c%d' % i, {'weight': 1.,
+                                         'threshold': 0.5,
+                                         'enabled': True,
+                                         'name': 'class_%d' % i})
+                            for i in range(classes)),
+            'layers': [{'units': 128, 'dropout': 0.1}
+                       for _ in range(classes // 10)]}
+
+
+def memory(fn):
+    """Bytes still allocated after fn, ie. used by its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def timeit(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--classes', type=int, default=100000)
+    args = parser.parse_args()
+
+    conf = make_config(args.classes)
+    names = ['c%d' % i for i in range(0, args.classes, 7)]
+
+    def lookup_dict(d):
+        classes = d['classes']
+        for name in names:
+            classes[name]['weight']
+
+    def lookup_blueprint(bp):
+        classes = bp.classes
+        for name in names:
+            getattr(classes, name).weight
+
+    print('%-10s %10s %10s %10s %10s'
+          % ('', 'memory', 'build', 'deepcopy', 'lookup'))
+    # leaves are shared with conf, only the containers are counted
+    cases = (('dict', lambda: deepcopy(conf), lookup_dict),
+             ('Blueprint', lambda: mlconf.Blueprint.from_dict(conf),
+              lookup_blueprint))
+    for name, build, lookup in cases:
+        result, mem = memory(build)
+        print('%-10s %8.1fMB %8.1fms %8.1fms %8.1fms'
+              % (name, mem / 2. ** 20,
+                 timeit(build) * 1000,
+                 timeit(lambda: deepcopy(result)) * 1000,
+                 timeit(lambda: lookup(result)) * 1000))
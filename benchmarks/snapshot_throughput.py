@@ -0,0 +1,113 @@
+"""Read throughput of a Blueprint shared between threads while a writer
+keeps updating it.
+
+Compares a lock guarded mutable Blueprint against a BlueprintHolder that
+publishes FrozenBlueprint snapshots.
+
+    python benchmarks/snapshot_throughput.py --readers 8 --duration 2
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+try:
+    import mlconf
+except ImportError:
+    # run from a checkout without installing: use the mlconf next to us
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mlconf
+
+
+def make_conf(width):
+    return mlconf.Blueprint.from_dict(
+        {'model': {'layer_%d' % i: {'dropout': 0.1, 'units': 128}
+                   for i in range(width)},
+         'optimizer': {'lr': 0, 'momentum': 0}})
+
+
+class LockedReader(object):
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            return (self.conf.optimizer.lr, self.conf.optimizer.momentum)
+
+    def write(self, i):
+        with self.lock:
+            self.conf['optimizer.lr'] = i
+            self.conf['optimizer.momentum'] = i
+
+
+class SnapshotReader(object):
+
+    def __init__(self, conf):
+        self.holder = mlconf.BlueprintHolder(conf)
+
+    def read(self):
+        snap = self.holder.snapshot
+        return (snap.optimizer.lr, snap.optimizer.momentum)
+
+    def write(self, i):
+        self.holder.update({'optimizer.lr': i, 'optimizer.momentum': i})
+
+
+def run(impl, readers, duration, write_interval):
+    done = threading.Event()
+    counts = [0] * readers
+    torn = [0] * readers
+
+    def read_loop(idx):
+        n = 0
+        bad = 0
+        read = impl.read
+        while not done.is_set():
+            lr, momentum = read()
+            if lr != momentum:
+                bad += 1
+            n += 1
+        counts[idx] = n
+        torn[idx] = bad
+
+    def write_loop():
+        i = 0
+        while not done.is_set():
+            impl.write(i)
+            i += 1
+            time.sleep(write_interval)
+        return i
+
+    threads = [threading.Thread(target=read_loop, args=(i,))
+               for i in range(readers)]
+    writer = threading.Thread(target=write_loop)
+    for t in threads:
+        t.start()
+    writer.start()
+    time.sleep(duration)
+    done.set()
+    for t in threads:
+        t.join()
+    writer.join()
+    return sum(counts), sum(torn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=2.)
+    parser.add_argument('--width', type=int, default=100,
+                        help='number of layer entries in the config')
+    parser.add_argument('--write-interval', type=float, default=0.001,
+                        help='seconds to sleep between writes')
+    args = parser.parse_args()
+
+    for name, cls in (('locked', LockedReader), ('snapshot', SnapshotReader)):
+        impl = cls(make_conf(args.width))
+        reads, torn = run(impl, args.readers, args.duration,
+                          args.write_interval)
+        print('%-10s reads/s: %12.0f  torn reads: %d'
+              % (name, reads / args.duration, torn))
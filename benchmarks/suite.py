@@ -0,0 +1,265 @@
+"""Benchmarks for the hot paths of mlconf on synthetic configs.
+
+Each case generates a config with the given breadth (children per mapping),
+depth (levels of nesting), leaves (entries per innermost mapping) and grid
+axes/values (keys overridden with several values by the grid action).
+Time is the best (and median) of a number of repeats, peak memory is
+measured in a separate run with tracemalloc.
+
+    # run and save a baseline
+    python benchmarks/suite.py run --save baseline.json
+    # run again after some changes and compare
+    python benchmarks/suite.py run --save new.json
+    python benchmarks/suite.py compare baseline.json new.json --threshold 0.1
+
+compare exits with status 1 if any benchmark regressed by more than the
+threshold (a fraction, 0.1 means 10% slower or more memory).
+
+mlconf does not need to be installed: if it cannot be imported, the
+checkout this script lives in is used.
+
+The suite also runs against older versions of mlconf, eg. to compare
+with baseline.json which was recorded on the tree before the performance
+work:
+
+    git archive <commit> mlconf | tar -x -C /tmp/old
+    PYTHONPATH=/tmp/old python benchmarks/suite.py run --save old.json
+"""
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from copy import deepcopy
+
+import yaml
+try:
+    import mlconf
+except ImportError:
+    # run from a checkout without installing: use the mlconf next to us
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mlconf
+
+
+# Older versions of mlconf do not cache parsed files
+clear_fragment_cache = getattr(mlconf, 'clear_fragment_cache', lambda: None)
+
+
+# name: (breadth, depth, leaves, grid axes, grid values)
+CASES = {'small': (4, 2, 5, 2, 3),
+         'wide': (200, 1, 10, 3, 3),
+         'deep': (2, 8, 3, 2, 3),
+         'large': (10, 3, 5, 2, 3)}
+
+
+def make_config(breadth, depth, leaves):
+    """Nested dict with breadth**depth innermost mappings of leaves
+    entries each, leaves cycle through int, float, str, bool and list."""
+    if depth == 0:
+        d = dict()
+        for i in range(leaves):
+            kind = i % 5
+            if kind == 0:
+                d['p%d' % i] = i
+            elif kind == 1:
+                d['p%d' % i] = i * 0.5
+            elif kind == 2:
+                d['p%d' % i] = 'value_%d' % i
+            elif kind == 3:
+                d['p%d' % i] = bool(i % 2)
+            else:
+                d['p%d' % i] = [i, i + 1, i + 2]
+        return d
+    return dict(('k%d' % i, make_config(breadth, depth - 1, leaves))
+                for i in range(breadth))
+
+
+def grid_args(conf, axes, values):
+    """Command line overrides for the first axes int entries of conf."""
+    keys = [key for key, val in mlconf.to_flat_dict(conf).items()
+            if type(val) == int][:axes]
+    args = []
+    for key in keys:
+        args.append('--%s' % key)
+        args.extend(str(v) for v in range(values))
+    return args
+
+
+def make_benchmarks(conf, filename, axes, values):
+    """Return {name: callable}, each callable runs the benchmark once."""
+    flat = mlconf.to_flat_dict(conf)
+    bp = mlconf.Blueprint.from_dict(conf)
+    overrides = grid_args(conf, axes, values)
+
+    def yaml_load():
+        clear_fragment_cache()
+        mlconf.dict_from_file(filename)
+
+    def loader_action():
+        clear_fragment_cache()
+        parser = mlconf.ArgumentParser()
+        parser.add_argument('--load', action=mlconf.YAMLLoaderAction)
+        parser.parse_args(['--load', filename])
+
+    def grid_action():
+        clear_fragment_cache()
+        parser = mlconf.ArgumentParser()
+        parser.add_argument('--load', action=mlconf.YAMLGridSearchAction)
+        parser.parse_args(['--load', filename] + overrides)
+
+    def repr_cold():
+        # a copy so that we do not hit the cached repr
+        repr(deepcopy(bp))
+
+    return {'yaml_load': yaml_load,
+            'loader_action': loader_action,
+            'to_flat_dict': lambda: mlconf.to_flat_dict(conf),
+            'to_nested_dict': lambda: mlconf.to_nested_dict(flat),
+            'from_dict': lambda: mlconf.Blueprint.from_dict(conf),
+            'as_dict': bp.as_dict,
+            'as_flat_dict': bp.as_flat_dict,
+            'deepcopy': lambda: deepcopy(bp),
+            'build': bp.build,
+            'grid_action': grid_action,
+            'repr_cold': repr_cold}
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'time_min': min(times),
+            'time_median': statistics.median(times),
+            'peak_memory': peak}
+
+
+def run(cases, repeat, only=None, out=sys.stdout):
+    results = dict()
+    tmpdir = tempfile.mkdtemp(prefix='mlconf_bench_')
+    try:
+        for name, (breadth, depth, leaves, axes, values) in cases.items():
+            conf = make_config(breadth, depth, leaves)
+            filename = os.path.join(tmpdir, '%s.yaml' % name)
+            with open(filename, 'w') as f:
+                f.write(yaml.safe_dump(conf, sort_keys=False))
+            n_leaves = len(mlconf.to_flat_dict(conf))
+            out.write('# %s: breadth=%d depth=%d leaves=%d grid=%d^%d '
+                      '(%d entries)\n'
+                      % (name, breadth, depth, leaves, values, axes,
+                         n_leaves))
+            benchmarks = make_benchmarks(conf, filename, axes, values)
+            for bench, fn in benchmarks.items():
+                if only and bench not in only:
+                    continue
+                result = measure(fn, repeat)
+                results['%s/%s' % (name, bench)] = result
+                out.write('%-28s %10.3f ms %10.1f KiB\n'
+                          % ('%s/%s' % (name, bench),
+                             result['time_min'] * 1000,
+                             result['peak_memory'] / 1024.))
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def compare(old, new, threshold, mem_threshold, out=sys.stdout):
+    """Print the change of each benchmark present in both result sets,
+    returns the names of the benchmarks that regressed."""
+    regressions = []
+    out.write('%-28s %10s %10s\n' % ('benchmark', 'time', 'memory'))
+    for key in sorted(set(old) & set(new)):
+        time_ratio = new[key]['time_min'] / max(old[key]['time_min'], 1e-9)
+        mem_ratio = (new[key]['peak_memory'] /
+                     float(max(old[key]['peak_memory'], 1)))
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append('TIME')
+        if mem_ratio > 1 + mem_threshold:
+            flags.append('MEMORY')
+        if flags:
+            regressions.append(key)
+        out.write('%-28s %+9.1f%% %+9.1f%% %s\n'
+                  % (key, (time_ratio - 1) * 100, (mem_ratio - 1) * 100,
+                     ' '.join('REGRESSION(%s)' % f for f in flags)))
+    for key in sorted(set(old) ^ set(new)):
+        out.write('%-28s only in %s\n' % (key, 'old' if key in old else 'new'))
+    return regressions
+
+
+def parse_case(s):
+    try:
+        name, params = s.split('=')
+        params = tuple(int(p) for p in params.split(','))
+        assert len(params) == 5
+    except (ValueError, AssertionError):
+        raise argparse.ArgumentTypeError(
+            'Expected NAME=BREADTH,DEPTH,LEAVES,AXES,VALUES got %s' % s)
+    return name, params
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--cases', nargs='+', choices=list(CASES),
+                            default=list(CASES),
+                            help='predefined cases to run')
+    run_parser.add_argument('--case', action='append', type=parse_case,
+                            default=[],
+                            help='extra case NAME=BREADTH,DEPTH,LEAVES,'
+                                 'AXES,VALUES, can be repeated')
+    run_parser.add_argument('--bench', nargs='+',
+                            help='only run these benchmarks')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--save', help='write results to a json file')
+
+    cmp_parser = subparsers.add_parser('compare',
+                                       help='compare two saved results')
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    cmp_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='allowed relative slow down')
+    cmp_parser.add_argument('--mem-threshold', type=float, default=0.1,
+                            help='allowed relative increase in memory')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        cases = dict((name, CASES[name]) for name in args.cases)
+        cases.update(args.case)
+        results = run(cases, args.repeat, only=args.bench)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'python': platform.python_version(),
+                           'platform': platform.platform(),
+                           'cases': cases,
+                           'results': results}, f, indent=2)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)['results']
+        with open(args.new) as f:
+            new = json.load(f)['results']
+        regressions = compare(old, new, args.threshold, args.mem_threshold)
+        if regressions:
+            print('\n%d benchmark(s) regressed' % len(regressions))
+            sys.exit(1)
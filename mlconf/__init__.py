@@ -1,13 +1,17 @@
 import os
+import re
 import sys
 import ast
+import mmap
 import yaml
 import glob
 import argparse
+import warnings
+import operator
 import functools
 import importlib
 from copy import deepcopy
-from itertools import product
+from itertools import product, count
 
 
 # TODO: This function has a very similar use with Blueprint.to_path_dict
@@ -94,6 +98,35 @@ def parse_value(v):
         return str(v)
 
 
+def _translate_segment(segment):
+    regex = []
+    for c in segment:
+        if c == '*':
+            regex.append('[^.]*')
+        elif c == '?':
+            regex.append('[^.]')
+        else:
+            regex.append(re.escape(c))
+    return ''.join(regex)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_pattern(pattern):
+    """Compile a dotted path pattern into a regular expression that
+    matches paths prefixed with a '.', eg. 'a.**.b' -> '\\.a(\\.[^.]+)*\\.b'
+    * matches a single (part of a) key, ** any number of keys. As in
+    glob, a trailing ** needs at least one key: 'a.**' does not match 'a'."""
+    regex = []
+    segments = pattern.split('.')
+    for i, segment in enumerate(segments):
+        if segment == '**':
+            regex.append(r'(?:\.[^.]+)+' if i == len(segments) - 1
+                         else r'(?:\.[^.]+)*')
+        else:
+            regex.append(r'\.' + _translate_segment(segment))
+    return re.compile(''.join(regex) + r'\Z')
+
+
 def get_deep_attr(obj, key, delim='.'):
     parts = key.split(delim)
     return functools.reduce(lambda x, y: getattr(x, y), parts, obj)
@@ -112,16 +145,326 @@ def set_deep_attr(obj, key, val, delim='.'):
         setattr(obj, key, val)
 
 
-def dict_from_file(filename):
+class ArrayRef(object):
+    """Reference to a (potentially large) array stored in an external file.
+
+    In YAML files these are written using the !array tag:
+
+        class_weights: !array weights.npy
+
+    Relative paths are resolved against the directory of the YAML file.
+    The file is only opened on first access of the data, .npy files are
+    memory mapped using numpy, any other file is exposed as a read only
+    memoryview of a memory mapped buffer. Copying a Blueprint copies the
+    reference, not the data, and to_file writes the reference back out
+    relative to the directory of the new file."""
+
+    __slots__ = ('path', 'base', '_data')
+
+    TAG = '!array'
+
+    def __init__(self, path, base=None):
+        self.path = path
+        self.base = base
+        self._data = None
+
+    @property
+    def filename(self):
+        return os.path.join(self.base or '', self.path)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def relpath(self, base=None):
+        """Path of the array relative to the directory base, or absolute if
+        it can't be made relative (eg. on another drive). If base is None
+        the path is returned as it was written."""
+        if base is None:
+            return self.path
+        filename = os.path.abspath(self.filename)
+        try:
+            return os.path.relpath(filename, os.path.abspath(base))
+        except ValueError:
+            return filename
+
+    def _load(self):
+        filename = self.filename
+        if filename.endswith('.npy'):
+            try:
+                import numpy
+            except ImportError:
+                raise ImportError('numpy is needed to load array %s'
+                                  % filename)
+            return numpy.load(filename, mmap_mode='r')
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'')
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(buf)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        return self.data[idx]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __array__(self, *args, **kwargs):
+        import numpy
+        return numpy.asarray(self.data, *args, **kwargs)
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayRef):
+            return (os.path.abspath(self.filename) ==
+                    os.path.abspath(other.filename))
+        return False
+
+    def __hash__(self):
+        return hash(os.path.abspath(self.filename))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # The data is read only, sharing the reference is safe
+        return self
+
+    def __reduce__(self):
+        return (ArrayRef, (self.path, self.base))
+
+    def __repr__(self):
+        return 'ArrayRef(%r)' % self.path
+
+
+# Use the libyaml bindings if available, they are much faster.
+class BlueprintLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+    """Safe YAML loader that understands the mlconf specific tags."""
+
+    base = None
+
+    def construct_array_ref(self, node):
+        return ArrayRef(self.construct_scalar(node), base=self.base)
+
+
+class BlueprintDumper(getattr(yaml, 'CSafeDumper', yaml.SafeDumper)):
+    """Safe YAML dumper that understands the mlconf specific tags. ArrayRefs
+    are written relative to base, the directory of the output file."""
+
+    def __init__(self, stream, base=None, **kwargs):
+        super(BlueprintDumper, self).__init__(stream, **kwargs)
+        self.base = base
+
+    def represent_array_ref(self, data):
+        return self.represent_scalar(ArrayRef.TAG, data.relpath(self.base))
+
+
+BlueprintLoader.add_constructor(ArrayRef.TAG,
+                                BlueprintLoader.construct_array_ref)
+BlueprintDumper.add_representer(ArrayRef, BlueprintDumper.represent_array_ref)
+
+
+def load_yaml(stream, base=None):
+    loader = BlueprintLoader(stream)
+    loader.base = base
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
+
+
+def dump_yaml(d, base=None):
+    """Dump d as YAML, base is the directory the output will be written to
+    (see ArrayRef.relpath)."""
+    return yaml.dump(d,
+                     Dumper=functools.partial(BlueprintDumper, base=base),
+                     default_flow_style=False,
+                     sort_keys=False)
+
+
+# Parsed YAML files, keyed by absolute path. Entries are reused as long as
+# the modification time and size of the file are unchanged, so a base file
+# shared by many configs is only parsed once per process.
+_FRAGMENT_CACHE = dict()
+
+
+def clear_fragment_cache():
+    _FRAGMENT_CACHE.clear()
+
+
+def _load_fragment(filename):
+    """Return the parsed contents of filename.
+    NOTE: The result is shared, it must not be modified."""
+    stat = os.stat(filename)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _FRAGMENT_CACHE.get(filename)
+    if cached is not None and cached[0] == version:
+        return cached[1]
     with open(filename, 'r') as f:
-        d = yaml.safe_load(f.read())
+        d = load_yaml(f.read(), base=os.path.dirname(filename))
+    _FRAGMENT_CACHE[filename] = (version, d)
+    return d
+
+
+def merge_dicts(base, overlay):
+    """Deep merge overlay onto base without modifying either of them.
+    Nested dicts are merged, any other value in overlay replaces the value
+    in base. Keys keep the position they had in base, new keys are added
+    at the end. Subtrees that do not need merging are shared, not copied."""
+    merged = dict(base)
+    for key, val in overlay.items():
+        prev = merged.get(key)
+        if isinstance(prev, dict) and isinstance(val, dict):
+            merged[key] = merge_dicts(prev, val)
+        else:
+            merged[key] = val
+    return merged
+
+
+def _compose(obj, base_dir, stack):
+    """Copy obj replacing $include entries with the (composed) contents
+    of the files they point to. Entries next to $include override the
+    included values."""
+    if isinstance(obj, dict):
+        composed = dict((key, _compose(val, base_dir, stack))
+                        for key, val in obj.items()
+                        if key != Blueprint.INCLUDE)
+        includes = obj.get(Blueprint.INCLUDE)
+        if includes is None:
+            return composed
+        if isinstance(includes, str):
+            includes = [includes]
+        included = dict()
+        for include in includes:
+            filename = os.path.join(base_dir, include)
+            included = merge_dicts(included, _compose_file(filename, stack))
+        return merge_dicts(included, composed)
+    elif isinstance(obj, list):
+        return [_compose(val, base_dir, stack) for val in obj]
+    elif isinstance(obj, tuple):
+        return tuple(_compose(val, base_dir, stack) for val in obj)
+    return obj
+
+
+def _compose_file(filename, stack):
+    filename = os.path.abspath(filename)
+    if filename in stack:
+        raise ValueError('Circular %s: %s'
+                         % (Blueprint.INCLUDE,
+                            ' -> '.join(stack + [filename])))
+    stack.append(filename)
+    d = _compose(_load_fragment(filename), os.path.dirname(filename), stack)
+    stack.pop()
+    if len(stack) and not isinstance(d, dict):
+        raise ValueError('Included file %s does not contain a mapping'
+                         % filename)
     return d
 
 
+def dict_from_file(filename):
+    """Load a YAML file, resolving any $include entries. The result is
+    a new dict that can be freely modified."""
+    return _compose_file(filename, [])
+
+
+def dict_from_files(*filenames):
+    """Load and deep merge YAML files, later files override earlier ones."""
+    return functools.reduce(merge_dicts,
+                            (dict_from_file(f) for f in filenames),
+                            dict())
+
+
 def flat_dict_from_file(filename, delim='.'):
     return to_flat_dict(dict_from_file(filename), delim=delim)
 
 
+def split_filenames(values):
+    """Split the values passed to a YAML action into the leading filenames
+    and the rest of the options."""
+    for i, val in enumerate(values):
+        if i > 0 and val.startswith('-'):
+            return values[:i], values[i:]
+    return values, []
+
+
+# Prefix of environment variables that override yaml settings, the
+# rest of the name is the dotted key with . replaced by ENV_DELIM, eg.
+# MLCONF__model__encoder__dropout=0.2
+ENV_PREFIX = 'MLCONF__'
+ENV_DELIM = '__'
+
+
+def arg_type(val):
+    """Type used to convert strings from the command line (or environment)
+    to the type of the default value val."""
+    tp = type(val)
+    # bool('False') is true in python, and argparse doesn't
+    # bother erroring - or patching this
+    if tp == bool:
+        tp = lambda v: v.lower() in ('true', '1', 'yes')
+    return tp
+
+
+def env_key_index(conf, delim=ENV_DELIM):
+    """Map environment variable suffixes to the dotted keys of the flat
+    dict conf, eg. model__lr -> model.lr. Keys that contain delim can end
+    up with the same suffix (eg. a__b.c and a.b__c), such suffixes map to
+    a tuple of all their keys."""
+    index = dict()
+    for key in conf:
+        suffix = key.replace('.', delim)
+        other = index.get(suffix)
+        if other is None:
+            index[suffix] = key
+        elif isinstance(other, tuple):
+            index[suffix] = other + (key,)
+        else:
+            index[suffix] = (other, key)
+    return index
+
+
+def env_overrides(conf, environ=None, prefix=ENV_PREFIX, index=None,
+                  strict=False):
+    """Return {dotted.key: value} for the variables in environ (default:
+    os.environ) that start with prefix. Values are converted to the type
+    of the value in the flat dict conf, like on the command line. index
+    is the result of env_key_index(conf), pass it to avoid rebuilding it.
+
+    Variables that don't match any key are ignored with a warning, since
+    a job environment is often shared by scripts with different configs,
+    or raise a KeyError if strict is True. Variables that match more than
+    one key (see env_key_index) raise a ValueError."""
+    if environ is None:
+        environ = os.environ
+    if index is None:
+        index = env_key_index(conf)
+    overrides = dict()
+    for name, val in environ.items():
+        if not name.startswith(prefix):
+            continue
+        key = index.get(name[len(prefix):])
+        if key is None:
+            message = ('Environment variable %s does not match any setting'
+                       % name)
+            if strict:
+                raise KeyError(message)
+            warnings.warn(message)
+            continue
+        if isinstance(key, tuple):
+            raise ValueError('Environment variable %s is ambiguous, it '
+                             'matches %s' % (name, ' and '.join(key)))
+        try:
+            overrides[key] = arg_type(conf[key])(val)
+        except (TypeError, ValueError):
+            raise ValueError('Environment variable %s: cannot convert %r '
+                             'to %s' % (name, val, type(conf[key]).__name__))
+    return overrides
+
+
 class ArgumentParser(argparse.ArgumentParser):
     """Wrapper of argparse.ArgumentParser that exposes a dotable
     Blueprint object instead of the default Namespace object."""
@@ -197,6 +540,16 @@ class YAMLLoaderAction(argparse.Action):
 
         myscript.py --arg1 foo --yamlfile dir/conf.yaml --arg_from_yaml bar
 
+    More than one yaml file can be passed, later files are deep merged
+    on top of earlier ones:
+
+        myscript.py --yamlfile base.yaml exp.yaml --arg_from_yaml bar
+
+    Environment variables starting with env_prefix override the yaml
+    files and are overriden by the command line (None disables them):
+
+        MLCONF__arg_from_yaml=bar myscript.py --yamlfile dir/conf.yaml
+
     """
 
     def __init__(self,
@@ -204,9 +557,11 @@ class YAMLLoaderAction(argparse.Action):
                  dest=argparse.SUPPRESS,
                  help=None,
                  metavar=None,
-                 required=True):
+                 required=True,
+                 env_prefix=ENV_PREFIX):
 
         self._choices_actions = []
+        self.env_prefix = env_prefix
         help = help or 'YAML file with default settings'
         metavar = metavar or 'BLUEPRINT_FILE [--opt1 val1] [--opt2 val2]'
 
@@ -220,17 +575,20 @@ class YAMLLoaderAction(argparse.Action):
             metavar=metavar)
 
     def __call__(self, parser, namespace, values, option_string=None):
-        fname = values[0]
-        rest = values[1:]
-
-        if not os.path.isfile(fname):
-            raise argparse.ArgumentError(argument=self,
-                                         message="Path %s doesn't exist or is not a file" % fname)
-        elif not os.access(fname, os.R_OK):
-            raise argparse.ArgumentError(argument=self,
-                                         message='Path %s cannot be read' % fname)
-
-        conf = flat_dict_from_file(fname)
+        # Further files before the first option are overlaid on the first
+        fnames, rest = split_filenames(values)
+
+        for fname in fnames:
+            if not os.path.isfile(fname):
+                raise argparse.ArgumentError(argument=self,
+                                             message="Path %s doesn't exist or is not a file" % fname)
+            elif not os.access(fname, os.R_OK):
+                raise argparse.ArgumentError(argument=self,
+                                             message='Path %s cannot be read' % fname)
+
+        conf = to_flat_dict(dict_from_files(*fnames))
+        env = self.env_conf(conf)
+        conf.update(env)
         my_reprs = ' '.join(self.option_strings)
         if sys.version_info[:2] < (3, 5):
             subparser = argparse.ArgumentParser(formatter_class=MLHelpFormatter,
@@ -248,11 +606,7 @@ class YAMLLoaderAction(argparse.Action):
                                 'global opts use -h or --help before %s.'
                                 % (my_reprs, my_reprs))
         for key, val in conf.items():
-            # bool('False') is true in python, and argparse doesn't
-            # bother erroring - or patching this
-            tp = type(val)
-            if tp == bool:
-                tp = lambda v: v.lower() in ('true', '1', 'yes')
+            tp = arg_type(val)
             subparser.add_argument('--%s' % key,
                                    default=val,
                                    required=False,
@@ -261,7 +615,7 @@ class YAMLLoaderAction(argparse.Action):
                                    action=argparse._StoreAction,
                                    metavar=type(val).__name__)
         # set blueprint
-        setattr(namespace, self.dest, fname)
+        setattr(namespace, self.dest, fnames[0] if len(fnames) == 1 else fnames)
         # remove this action after dealing with it because otherwise
         # argparse will whine that we haven't completed it
         parser._remove_action(self)
@@ -279,6 +633,27 @@ class YAMLLoaderAction(argparse.Action):
                     'part of the script, please set such keys before %s.'
                     % (arg_strings, self.option_strings[0]))
 
+    def env_conf(self, conf):
+        """Overrides of the flat dict conf from the environment."""
+        if self.env_prefix is None:
+            return dict()
+        try:
+            return env_overrides(conf, prefix=self.env_prefix)
+        except ValueError as e:
+            raise argparse.ArgumentError(argument=self, message=e.args[0])
+
+
+def iter_grid(conf, grid_search_kvs):
+    """Yield a copy of conf for each combination of the values in
+    grid_search_kvs, a dict of {dotted.key: [values as strings]}."""
+    keys = list(grid_search_kvs.keys())
+    grid = product(*[parse_values(v) for v in grid_search_kvs.values()])
+    for setup in grid:
+        new_conf = deepcopy(conf)
+        for key, val in zip(keys, setup):
+            new_conf[key] = val
+        yield new_conf
+
 
 class YAMLGridSearchAction(argparse.Action):
     """Action that can be used with argparse to dynamically create arguments
@@ -290,6 +665,16 @@ class YAMLGridSearchAction(argparse.Action):
 
         myscript.py --arg1 foo --yamlfile dir/conf.yaml --arg_from_yaml bar
 
+    More than one yaml file can be passed, later files are deep merged
+    on top of earlier ones:
+
+        myscript.py --yamlfile base.yaml exp.yaml --arg_from_yaml bar
+
+    Environment variables starting with env_prefix override the yaml
+    files and are overriden by the command line (None disables them):
+
+        MLCONF__arg_from_yaml=bar myscript.py --yamlfile dir/conf.yaml
+
     """
 
     def __init__(self,
@@ -297,9 +682,11 @@ class YAMLGridSearchAction(argparse.Action):
                  dest=argparse.SUPPRESS,
                  help=None,
                  metavar=None,
-                 required=True):
+                 required=True,
+                 env_prefix=ENV_PREFIX):
 
         self._choices_actions = []
+        self.env_prefix = env_prefix
         help = help or 'YAML file with default settings'
         metavar = metavar or 'BLUEPRINT_FILE [--opt1 val1] [--opt2 val2]'
 
@@ -313,17 +700,20 @@ class YAMLGridSearchAction(argparse.Action):
             metavar=metavar)
 
     def __call__(self, parser, namespace, values, option_string=None):
-        fname = values[0]
-        rest = values[1:]
-
-        if not os.path.isfile(fname):
-            raise argparse.ArgumentError(argument=self,
-            message="Path %s doesn't exist or is not a file" % fname)
-        elif not os.access(fname, os.R_OK):
-            raise argparse.ArgumentError(argument=self,
-            message='Path %s cannot be read' % fname)
-
-        conf = flat_dict_from_file(fname)
+        # Further files before the first option are overlaid on the first
+        fnames, rest = split_filenames(values)
+
+        for fname in fnames:
+            if not os.path.isfile(fname):
+                raise argparse.ArgumentError(argument=self,
+                message="Path %s doesn't exist or is not a file" % fname)
+            elif not os.access(fname, os.R_OK):
+                raise argparse.ArgumentError(argument=self,
+                message='Path %s cannot be read' % fname)
+
+        conf = to_flat_dict(dict_from_files(*fnames))
+        env = self.env_conf(conf)
+        conf.update(env)
         my_reprs = ' '.join(self.option_strings)
         if sys.version_info[:2] < (3, 5):
             subparser = argparse.ArgumentParser(formatter_class=MLHelpFormatter,
@@ -341,11 +731,7 @@ class YAMLGridSearchAction(argparse.Action):
                                 'global opts use -h or --help before %s.'
                                 % (my_reprs, my_reprs))
         for key, val in conf.items():
-            # bool('False') is true in python, and argparse doesn't
-            # bother erroring - or patching this
-            tp = type(val)
-            if tp == bool:
-                tp = lambda v: v.lower() in ('true', '1', 'yes')
+            tp = arg_type(val)
             subparser.add_argument('--%s' % key,
                                    default=val,
                                    required=False,
@@ -355,14 +741,16 @@ class YAMLGridSearchAction(argparse.Action):
                                    action=argparse._StoreAction,
                                    metavar=type(val).__name__)
         # set blueprint
-        setattr(namespace, self.dest, fname)
+        setattr(namespace, self.dest, fnames[0] if len(fnames) == 1 else fnames)
         # remove this action after dealing with it because otherwise
         # argparse will whine that we haven't completed it
         parser._remove_action(self)
 
         subnamespace, arg_strings = subparser.parse_known_args(rest, None)
 
-        conf = Blueprint.from_file(fname)
+        conf = Blueprint.from_files(*fnames)
+        for key, value in env.items():
+            conf[key] = value
 
         grid_search_kvs = dict()
         for key, value in vars(subnamespace).items():
@@ -372,17 +760,8 @@ class YAMLGridSearchAction(argparse.Action):
             if value != default_value:
                 grid_search_kvs[key] = value
 
-        grid = product(*[parse_values(v)
-                         for v in grid_search_kvs.values()])
-
-        blueprints = []
-        for setup in grid:
-            new_conf = deepcopy(conf)
-            for key, val in zip(grid_search_kvs.keys(), setup):
-                new_conf[key] = val
-            blueprints.append(new_conf)
-
-        setattr(namespace, 'grid_blueprints', blueprints)
+        setattr(namespace, 'grid_blueprints',
+                self.expand(conf, grid_search_kvs))
 
         # if we didn't manage to parse everything..
         if arg_strings:
@@ -392,7 +771,21 @@ class YAMLGridSearchAction(argparse.Action):
             message='Unknown settings. Trying to set %r after using '
                     'YAMLLoaderAction. If these are settings for the main '
                     'part of the script, please set such keys before %s.'
-                    % (arg_strings, self.option_strings[0]))
+                    % (arg_strings, (self.option_strings or [self.dest])[0]))
+
+    def expand(self, conf, grid_search_kvs):
+        """Return the list of Blueprints to grid search over. Subclasses
+        can override this, eg. to return iter_grid lazily."""
+        return list(iter_grid(conf, grid_search_kvs))
+
+    def env_conf(self, conf):
+        """Overrides of the flat dict conf from the environment."""
+        if self.env_prefix is None:
+            return dict()
+        try:
+            return env_overrides(conf, prefix=self.env_prefix)
+        except ValueError as e:
+            raise argparse.ArgumentError(argument=self, message=e.args[0])
 
 
 class Blueprint(object):
@@ -410,23 +803,122 @@ class Blueprint(object):
     # in case you must use positional args
     # this may be a bit counter-intuitive
     POSITIONAL = '%spos_args' % BP_PREFIX
+    # include the contents of other YAML files, eg:
+    #   $include: [datasets/imagenet.yaml, models/resnet.yaml]
+    INCLUDE = '%sinclude' % BP_PREFIX
+    # Subclasses that must never be modified in place (eg. FrozenBlueprint)
+    READ_ONLY = False
+
+    # Entries are stored in __dict__. The single dunder named slot holds
+    # bookkeeping that must never clash with a config key: a dict of cached
+    # values (eg. the repr), each with the generation it was computed at.
+    __slots__ = ('__dict__', '__weakref__', '__bp_cache__')
+
+    # Bumped by every change to any Blueprint, cached values of an older
+    # generation are stale. This keeps writes O(1) (no need to find and
+    # invalidate the Blueprints containing the changed one) at the cost of
+    # also dropping caches of Blueprints that were not changed.
+    _generations = count(1)
+    _generation = 0
 
     def __init__(self, **kwargs):
         super(Blueprint, self).__init__()
+        # A new Blueprint has nothing cached, so we can skip __setattr__.
+        # NOTE: setting attributes one by one (rather than updating
+        # __dict__) lets python share the keys between Blueprints.
         for key, val in kwargs.items():
-            setattr(self, key, val)
+            object.__setattr__(self, key, val)
 
-    def __repr__(self):
-        contents = yaml.safe_dump(self.as_dict(),
-                                  default_flow_style=False,
-                                  sort_keys=False)
+    def __setattr__(self, key, val):
+        object.__setattr__(self, key, val)
+        Blueprint._invalidate()
+
+    def __delattr__(self, key):
+        object.__delattr__(self, key)
+        Blueprint._invalidate()
+
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, state):
+        for key, val in state.items():
+            object.__setattr__(self, key, val)
+
+    def __deepcopy__(self, memo):
+        # Much faster than going through __reduce_ex__ and __setstate__
+        copy = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copy
+        for key, val in deepcopy(self.__dict__, memo).items():
+            object.__setattr__(copy, key, val)
+        return copy
+
+    @staticmethod
+    def _invalidate():
+        """Mark the cached values of all Blueprints as stale.
+        NOTE: Only changes made through setattr / __setitem__ are tracked,
+        modifying a list in place does not invalidate the cached repr."""
+        Blueprint._generation = next(Blueprint._generations)
+
+    def _cached(self, name, compute, valid=None):
+        """Return the cached value name, calling compute if it is missing,
+        stale or valid(value) is False. Read only Blueprints never change,
+        their cache is always valid."""
+        cache = getattr(self, '__bp_cache__', None)
+        if cache is None:
+            cache = dict()
+            object.__setattr__(self, '__bp_cache__', cache)
+        generation = Blueprint._generation
+        entry = cache.get(name)
+        if (entry is None or
+                (entry[0] != generation and not type(self).READ_ONLY) or
+                (valid is not None and not valid(entry[1]))):
+            entry = (generation, compute())
+            cache[name] = entry
+        return entry[1]
+
+    def _render(self):
+        contents = dump_yaml(self.as_dict())
         contents = contents.replace('\n', '\n  ').rstrip()
         return 'Blueprint:\n  %s' % (contents)
 
+    def __repr__(self):
+        # The yaml dump is expensive for large Blueprints, so we keep it
+        # around until a Blueprint is modified.
+        return self._cached('repr', self._render)
+
     def __str__(self):
-        contents = yaml.safe_dump(self.as_dict(),
-                                  default_flow_style=False,
-                                  sort_keys=False)
+        return self.__repr__()
+
+    @staticmethod
+    def _summarise(obj, depth, max_depth, max_items):
+        if isinstance(obj, dict):
+            if depth >= max_depth:
+                return '<%d keys>' % len(obj)
+            summary = dict()
+            for i, (key, val) in enumerate(obj.items()):
+                if i == max_items:
+                    summary['...'] = '<%d more keys>' % (len(obj) - i)
+                    break
+                summary[key] = Blueprint._summarise(val, depth + 1,
+                                                    max_depth, max_items)
+            return summary
+        elif isinstance(obj, (list, tuple)):
+            if depth >= max_depth:
+                return '<%d items>' % len(obj)
+            summary = [Blueprint._summarise(val, depth + 1,
+                                            max_depth, max_items)
+                       for val in obj[:max_items]]
+            if len(obj) > max_items:
+                summary.append('<%d more items>' % (len(obj) - max_items))
+            return summary
+        return obj
+
+    def summary(self, max_depth=3, max_items=10):
+        """Render a truncated view of the Blueprint, useful for logging
+        large configs. Nesting deeper than max_depth is collapsed and only
+        the first max_items entries of each mapping and list are shown."""
+        d = Blueprint._summarise(self.as_dict(), 0, max_depth, max_items)
+        contents = dump_yaml(d)
         contents = contents.replace('\n', '\n  ').rstrip()
         return 'Blueprint:\n  %s' % (contents)
 
@@ -466,6 +958,88 @@ class Blueprint(object):
     def __setitem__(self, key, value):
         return set_deep_attr(self, key, value, delim='.')
 
+    def _get_path_index(self):
+        """List of (path, value, container, key) for every entry in the
+        tree in depth first order. Paths start with a '.' (this makes
+        matching ** simpler), container[key] or getattr(container, key)
+        is the value."""
+        return self._cached('path_index', self._build_path_index,
+                            valid=Blueprint._lists_unchanged)[0]
+
+    def _build_path_index(self):
+        """Return the path index along with (list, items) pairs, lists can
+        change in place without invalidating the cache so we check them
+        against a copy of their items on every query."""
+        index, lists = [], []
+        stack = Blueprint._path_children('', self)
+        while stack:
+            entry = stack.pop()
+            index.append(entry)
+            val = entry[1]
+            if isinstance(val, (Blueprint, list, tuple)):
+                if isinstance(val, list):
+                    lists.append((val, tuple(val)))
+                stack.extend(Blueprint._path_children(entry[0], val))
+        return index, lists
+
+    @staticmethod
+    def _lists_unchanged(cached):
+        return all(len(lst) == len(items) and
+                   all(map(operator.is_, lst, items))
+                   for lst, items in cached[1])
+
+    @staticmethod
+    def _path_children(prefix, node):
+        """Path index entries of the children of node, in reverse order
+        so that popping them off a stack visits them in order."""
+        if isinstance(node, Blueprint):
+            children = node.__dict__.items()
+        else:
+            children = enumerate(node)
+        return [('%s.%s' % (prefix, key), val, node, key)
+                for key, val in children][::-1]
+
+    def select(self, pattern):
+        """Return a dict of {path: value} for all entries whose dotted path
+        matches pattern. In a pattern * matches any single key or list
+        index, ** matches any number of keys and * or ? can also be used
+        inside keys, eg:
+
+            bp.select('model.*.dropout')
+            bp.select('**.lr')
+            bp.select('layers.0.*')
+            bp.select('model.enc*.units')
+        """
+        match = compile_pattern(pattern).match
+        return dict((entry[0][1:], entry[1])
+                    for entry in self._get_path_index() if match(entry[0]))
+
+    def update(self, pattern, value):
+        """Set all entries matching pattern (see select) to a copy of value.
+        Returns the number of entries that were updated."""
+        match = compile_pattern(pattern).match
+        matches, replaced = [], None
+        # The index is in depth first order, so entries below a matched
+        # entry follow it. They are replaced along with it, skip them.
+        for path, _, container, key in self._get_path_index():
+            if replaced is not None and path.startswith(replaced):
+                continue
+            if match(path):
+                matches.append((path, container, key))
+                replaced = '%s.' % path
+        # check everything first, so we never apply half an update
+        for path, container, _ in matches:
+            if isinstance(container, tuple):
+                raise TypeError('Cannot update %s, it is inside a tuple'
+                                % path[1:])
+        for path, container, key in matches:
+            if isinstance(container, Blueprint):
+                setattr(container, key, deepcopy(value))
+            else:
+                container[key] = deepcopy(value)
+                Blueprint._invalidate()
+        return len(matches)
+
     def __contains__(self, key):
         try:
             self[key]
@@ -509,8 +1083,11 @@ class Blueprint(object):
         if attrs:
             classname = obj.__class__.__name__
             module = obj.__class__.__name__
+            # subclasses of Blueprint (eg. FrozenBlueprint) are containers
+            # too, they should not be recorded as classes to build.
+            is_blueprint = isinstance(obj, Blueprint)
             obj = dict(attrs)
-            if classname is not 'Blueprint':
+            if not is_blueprint:
                 obj[Blueprint.CLASS] = classname
                 obj[Blueprint.MODULE] = module
             # NOTE: may need to revisit below
@@ -564,15 +1141,27 @@ class Blueprint(object):
     def to_file(self, filename):
         d = self.as_dict()
         with open(filename, 'w') as f:
-            f.write(yaml.safe_dump(d, sort_keys=False, default_flow_style=False))
+            f.write(dump_yaml(d, base=os.path.dirname(filename)))
 
     @classmethod
     def from_file(cl, filename):
         d = dict_from_file(filename)
-        return cl.from_dict(d)
+        # dict_from_file returns a fresh dict, no need to copy it
+        return cl.from_dict(d, copy=False)
+
+    @classmethod
+    def from_files(cl, *filenames):
+        """Load YAML files and overlay them in order, eg:
+            Blueprint.from_files('base.yaml', 'cluster.yaml', 'exp.yaml')
+        """
+        d = dict_from_files(*filenames)
+        return cl.from_dict(d, copy=False)
 
     @staticmethod
     def build_children(d, verbose):
+        if isinstance(d, Blueprint) and type(d).READ_ONLY:
+            # build a mutable copy, never write into a read only Blueprint
+            d = d.thaw()
         attrs = getattr(d, '__dict__', None)
         if attrs:
             if all(attr in attrs.keys() for attr in [Blueprint.MODULE, Blueprint.CLASS]):
@@ -593,6 +1182,8 @@ class Blueprint(object):
                     # If we are inside the class params we only
                     # want to allow further class instantiation
                     attrs[key] = Blueprint.build_children(val, verbose)
+                if isinstance(d, Blueprint):
+                    d._invalidate()
         elif isinstance(d, dict):
             for key, val in d.items():
                 d[key] = Blueprint.build_children(val, verbose)
@@ -607,3 +1198,8 @@ class Blueprint(object):
             built = deepcopy(self)
             return Blueprint.build_children(built, verbose)
         return Blueprint.build_children(self, verbose)
+
+
+from mlconf.snapshot import FrozenBlueprint, BlueprintHolder
+from mlconf.shared import SharedBlueprint, SharedList
+from mlconf.scheduler import SuccessiveHalving, Hyperband, Trial
@@ -0,0 +1,209 @@
+"""mlconf command line tool.
+
+    # one yaml file per combination of the values passed on the command line
+    mlconf expand --out-dir sweep/ base.yaml exp.yaml --model.lr 0.1 0.01
+    # or a single JSON lines stream (stdout by default)
+    mlconf expand --jsonl sweep.jsonl base.yaml --model.lr 0.1 0.01
+    mlconf flatten conf.yaml
+    mlconf diff a.yaml b.yaml
+    mlconf get conf.yaml model.lr optimizer
+"""
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mlconf import (Blueprint, ArrayRef, MLHelpFormatter,
+                    YAMLGridSearchAction, iter_grid, dump_yaml)
+
+
+# Size of the buffer used for the output files and streams
+BUFFER_SIZE = 1 << 20
+
+
+class LazyGridSearchAction(YAMLGridSearchAction):
+    """YAMLGridSearchAction that does not materialise the grid, each
+    Blueprint is only created when it is about to be written out."""
+
+    def expand(self, conf, grid_search_kvs):
+        return iter_grid(conf, grid_search_kvs)
+
+
+def _json_default(obj, base=None):
+    if isinstance(obj, ArrayRef):
+        return obj.relpath(base)
+    raise TypeError('Object of type %s is not JSON serializable'
+                    % type(obj).__name__)
+
+
+def render(bp, fmt, base=None):
+    """Render bp as a string, ArrayRefs are written relative to the
+    directory base."""
+    if fmt == 'json':
+        return json.dumps(bp.as_dict(),
+                          default=lambda obj: _json_default(obj, base))
+    return dump_yaml(bp.as_dict(), base=base)
+
+
+def _write_file(filename, contents):
+    with open(filename, 'w', buffering=BUFFER_SIZE) as f:
+        f.write(contents)
+
+
+def write_files(blueprints, out_dir, name, fmt, jobs):
+    """Render each Blueprint and write it to out_dir. Rendering happens
+    in this thread while up to jobs threads write files."""
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    count = 0
+    if jobs <= 1:
+        for count, bp in enumerate(blueprints, 1):
+            filename = os.path.join(out_dir, name.format(index=count - 1))
+            _write_file(filename,
+                        render(bp, fmt, base=os.path.dirname(filename)))
+        return count
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for count, bp in enumerate(blueprints, 1):
+            filename = os.path.join(out_dir, name.format(index=count - 1))
+            contents = render(bp, fmt, base=os.path.dirname(filename))
+            pending.append(pool.submit(_write_file, filename, contents))
+            # bound memory: don't render too far ahead of the writers
+            while len(pending) > 4 * jobs:
+                pending.popleft().result()
+        while pending:
+            pending.popleft().result()
+    return count
+
+
+def write_stream(blueprints, out, base=os.curdir):
+    """Write each Blueprint as a line of JSON to out, ArrayRefs are written
+    relative to the directory base."""
+    count = 0
+    for count, bp in enumerate(blueprints, 1):
+        out.write(render(bp, 'json', base=base))
+        out.write('\n')
+    return count
+
+
+def expand(args):
+    if args.out_dir:
+        fmt = args.format or 'yaml'
+        name = args.name or ('{index:05d}.%s' % fmt)
+        count = write_files(args.grid_blueprints, args.out_dir, name, fmt,
+                            args.jobs)
+    elif args.jsonl and args.jsonl != '-':
+        with open(args.jsonl, 'w', buffering=BUFFER_SIZE) as f:
+            count = write_stream(args.grid_blueprints, f,
+                                 base=os.path.dirname(args.jsonl))
+    else:
+        count = write_stream(args.grid_blueprints, sys.stdout)
+    sys.stderr.write('Wrote %d blueprints\n' % count)
+    return 0
+
+
+def flatten(args):
+    flat = Blueprint.from_files(*args.blueprints).as_flat_dict()
+    if args.format == 'json':
+        sys.stdout.write(json.dumps(flat, default=_json_default, indent=2))
+        sys.stdout.write('\n')
+    else:
+        sys.stdout.write(dump_yaml(flat))
+    return 0
+
+
+def diff(args):
+    old = Blueprint.from_file(args.old).as_flat_dict()
+    new = Blueprint.from_file(args.new).as_flat_dict()
+    missing = object()
+    differ = False
+    for key in list(old) + [k for k in new if k not in old]:
+        old_val, new_val = old.get(key, missing), new.get(key, missing)
+        if old_val == new_val:
+            continue
+        differ = True
+        if old_val is not missing:
+            sys.stdout.write('- %s: %r\n' % (key, old_val))
+        if new_val is not missing:
+            sys.stdout.write('+ %s: %r\n' % (key, new_val))
+    return 1 if differ else 0
+
+
+def get(args):
+    bp = Blueprint.from_file(args.blueprint)
+    status = 0
+    for key in args.keys:
+        try:
+            val = bp[key]
+        except KeyError:
+            sys.stderr.write('Key %s not found\n' % key)
+            status = 1
+            continue
+        if isinstance(val, Blueprint):
+            val = val.as_dict()
+        if isinstance(val, (dict, list, tuple)):
+            sys.stdout.write(dump_yaml(val))
+        else:
+            sys.stdout.write('%s\n' % (val,))
+    return status
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='mlconf',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    p = subparsers.add_parser(
+        'expand',
+        formatter_class=MLHelpFormatter,
+        help='expand yaml files and command line overrides into a grid',
+        description='Options of the yaml files can be overriden by passing '
+                    'them after the files. Passing several values creates '
+                    'a blueprint for each combination of values. The '
+                    'options of this command must come before the files.')
+    p.add_argument('--out-dir', help='write one file per blueprint here')
+    p.add_argument('--name', help='filename template for --out-dir, '
+                                  'eg. run_{index:03d}.yaml')
+    p.add_argument('--format', choices=('yaml', 'json'),
+                   help='file format for --out-dir (default: yaml)')
+    p.add_argument('--jsonl', help='write a JSON lines stream to this file '
+                                   '(default: stdout)')
+    p.add_argument('--jobs', type=int, default=1,
+                   help='number of threads writing files')
+    p.add_argument('blueprint', action=LazyGridSearchAction,
+                   metavar='BLUEPRINT_FILE [...] [--opt1 val1 val2 ...]')
+    p.set_defaults(func=expand)
+
+    p = subparsers.add_parser('flatten',
+                              help='print a blueprint as dotted keys')
+    p.add_argument('blueprints', nargs='+', metavar='BLUEPRINT_FILE',
+                   help='files are overlaid in order')
+    p.add_argument('--format', choices=('yaml', 'json'), default='yaml')
+    p.set_defaults(func=flatten)
+
+    p = subparsers.add_parser('diff', help='print differing dotted keys, '
+                                           'exits with 1 if any differ')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.set_defaults(func=diff)
+
+    p = subparsers.add_parser('get', help='print values of dotted keys')
+    p.add_argument('blueprint', metavar='BLUEPRINT_FILE')
+    p.add_argument('keys', nargs='+', metavar='KEY', help='dotted key')
+    p.set_defaults(func=get)
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""Successive halving and Hyperband over Blueprints.
+
+Instead of running every configuration of a grid to completion, each
+configuration is first run with a small budget (eg. epochs), the best
+1/eta of them are promoted and run with eta times the budget and so on
+until max_budget is reached.
+
+The trial function receives a Trial with the blueprint, the budget and
+the rung and returns either its final metric (a number, numpy scalar or
+0-d array or tensor) or an iterable of intermediate metrics (the last one
+is used for ranking). It is run in a pool of processes, so it needs to be
+picklable (a module level function).
+
+    def train(trial):
+        model = trial.blueprint.build()
+        for epoch in range(trial.budget):
+            yield model.fit_epoch()
+
+    sh = SuccessiveHalving(train, grid_blueprints, min_budget=1,
+                           max_budget=27, eta=3, processes=8,
+                           state_file='sweep.json')
+    blueprint, metric = sh.run()
+
+Results are saved to state_file after each trial, running the same
+command again resumes from where it stopped. Budgets are always ints, trials
+that raise an exception are reported with a RuntimeWarning.
+"""
+import os
+import json
+import math
+import numbers
+import warnings
+import functools
+import itertools
+import multiprocessing
+
+from mlconf import Blueprint, ArrayRef
+
+
+class Trial(object):
+    """A configuration to be run with a given budget."""
+
+    def __init__(self, id, blueprint, budget, rung):
+        self.id = id
+        self.blueprint = blueprint
+        self.budget = budget
+        self.rung = rung
+
+    def __repr__(self):
+        return 'Trial(id=%r, budget=%r, rung=%r)' % (self.id, self.budget,
+                                                     self.rung)
+
+
+def _run_trial(trial_fn, trial):
+    """Returns (trial id, rung, metrics, error)."""
+    try:
+        result = trial_fn(trial)
+        # 0-d arrays and tensors (and numpy scalars) have ndim 0
+        if isinstance(result, numbers.Real) or \
+                getattr(result, 'ndim', None) == 0:
+            metrics = [float(result)]
+        else:
+            metrics = [float(m) for m in result]
+        if not metrics:
+            raise ValueError('Trial function did not report any metric')
+        return trial.id, trial.rung, metrics, None
+    except Exception as e:
+        return trial.id, trial.rung, None, '%s: %s' % (type(e).__name__, e)
+
+
+def _json_default(obj, base):
+    # ArrayRefs are saved as {"!array": path}, relative to the state file
+    if isinstance(obj, ArrayRef):
+        return {ArrayRef.TAG: obj.relpath(base)}
+    raise TypeError('Cannot save %r of type %s to the state file, '
+                    'Blueprints of trials should only contain JSON types '
+                    'and ArrayRefs' % (obj, type(obj).__name__))
+
+
+def _json_object(d, base):
+    if len(d) == 1 and ArrayRef.TAG in d:
+        return ArrayRef(d[ArrayRef.TAG], base=base)
+    return d
+
+
+def _save_json(filename, state):
+    base = os.path.dirname(filename)
+    contents = json.dumps(state, indent=1,
+                          default=lambda obj: _json_default(obj, base))
+    # write and move so that a crash never leaves a half written file
+    tmp = '%s.tmp' % filename
+    with open(tmp, 'w') as f:
+        f.write(contents)
+    os.replace(tmp, filename)
+
+
+def _load_json(filename):
+    base = os.path.dirname(filename)
+    with open(filename) as f:
+        return json.load(f, object_hook=lambda d: _json_object(d, base))
+
+
+class SuccessiveHalving(object):
+    """Successive halving over the Blueprints of an iterable.
+
+    At rung i each remaining trial is run with budget min_budget * eta**i,
+    the best max(1, n // eta) of the n trials at that rung are promoted,
+    until the budget would exceed max_budget. Budgets are rounded to ints
+    (at least 1). Trials whose function raised an exception are recorded,
+    reported with a warning and never promoted.
+
+    mode is 'min' if a lower metric is better, 'max' otherwise.
+    n_trials limits how many Blueprints are taken from blueprints, which
+    makes it possible to pass an infinite sampler. processes=1 runs
+    trials in this process, which is handy for debugging."""
+
+    def __init__(self,
+                 trial_fn,
+                 blueprints,
+                 min_budget=1,
+                 max_budget=27,
+                 eta=3,
+                 mode='min',
+                 n_trials=None,
+                 processes=None,
+                 state_file=None,
+                 state=None,
+                 on_save=None):
+        if mode not in ('min', 'max'):
+            raise ValueError("mode should be 'min' or 'max', got %r" % mode)
+        if eta < 2:
+            raise ValueError('eta should be at least 2, got %r' % eta)
+        if not 0 < min_budget <= max_budget:
+            raise ValueError('Need 0 < min_budget <= max_budget')
+        self.trial_fn = trial_fn
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.eta = eta
+        self.mode = mode
+        self.processes = processes
+        self.state_file = state_file
+        self.on_save = on_save
+
+        if state is None and state_file and os.path.isfile(state_file):
+            state = _load_json(state_file)
+        if state is not None:
+            # resuming with other settings would mix two schedules
+            for key in ('min_budget', 'max_budget', 'eta', 'mode'):
+                if state[key] != getattr(self, key):
+                    raise ValueError('Cannot resume a schedule with %s=%r '
+                                     'using %s=%r' % (key, state[key], key,
+                                                      getattr(self, key)))
+            # resume: the blueprints are the ones we saved
+            self.trials = state['trials']
+        else:
+            if n_trials is not None:
+                blueprints = itertools.islice(blueprints, n_trials)
+            self.trials = [{'id': i,
+                            'blueprint': bp.as_dict()
+                            if isinstance(bp, Blueprint) else dict(bp),
+                            'results': dict(),
+                            'error': None}
+                           for i, bp in enumerate(blueprints)]
+            self.save()
+
+    @property
+    def budgets(self):
+        budgets = []
+        budget = self.min_budget
+        # fractional budgets (eg. from Hyperband) are not exact
+        while budget <= self.max_budget * (1 + 1e-9):
+            budgets.append(max(1, int(round(budget))))
+            budget = budget * self.eta
+        return budgets
+
+    def state(self):
+        return {'min_budget': self.min_budget,
+                'max_budget': self.max_budget,
+                'eta': self.eta,
+                'mode': self.mode,
+                'trials': self.trials}
+
+    def save(self):
+        if self.on_save is not None:
+            self.on_save()
+        elif self.state_file:
+            _save_json(self.state_file, self.state())
+
+    def metric(self, trial, rung):
+        """Final metric of trial at rung, None if it failed or didn't run."""
+        metrics = trial['results'].get(str(rung))
+        return metrics[-1] if metrics else None
+
+    def promoted(self, rung):
+        """Trials that take part in rung, computed from the results of the
+        previous rungs so that the schedule can be resumed from the state."""
+        trials = self.trials
+        for r in range(rung):
+            done = [t for t in trials if self.metric(t, r) is not None]
+            done.sort(key=lambda t: self.metric(t, r),
+                      reverse=self.mode == 'max')
+            trials = done[:max(1, len(trials) // self.eta)]
+        return trials
+
+    def _run_rung(self, rung, budget):
+        pending = [Trial(t['id'], Blueprint.from_dict(t['blueprint']),
+                         budget, rung)
+                   for t in self.promoted(rung)
+                   if str(rung) not in t['results'] and not t['error']]
+        if not pending:
+            return
+        run = functools.partial(_run_trial, self.trial_fn)
+        if self.processes == 1:
+            results = map(run, pending)
+            self._collect(results)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            try:
+                self._collect(pool.imap_unordered(run, pending))
+            finally:
+                pool.close()
+                pool.join()
+
+    def _collect(self, results):
+        trials = dict((t['id'], t) for t in self.trials)
+        for trial_id, rung, metrics, error in results:
+            trial = trials[trial_id]
+            if error is not None:
+                trial['error'] = error
+                warnings.warn('Trial %d failed at rung %d: %s'
+                              % (trial_id, rung, error), RuntimeWarning)
+            else:
+                trial['results'][str(rung)] = metrics
+            self.save()
+
+    def run(self):
+        """Run (or resume) all rungs, returns best (blueprint, metric)."""
+        for rung, budget in enumerate(self.budgets):
+            self._run_rung(rung, budget)
+        return self.best()
+
+    def best(self):
+        """Best (blueprint, metric) at the highest rung with results."""
+        for rung in reversed(range(len(self.budgets))):
+            done = [t for t in self.trials if self.metric(t, rung) is not None]
+            if done:
+                pick = min if self.mode == 'min' else max
+                trial = pick(done, key=lambda t: self.metric(t, rung))
+                return (Blueprint.from_dict(trial['blueprint']),
+                        self.metric(trial, rung))
+        return None, None
+
+
+class Hyperband(object):
+    """Hyperband runs several brackets of successive halving, trading off
+    the number of configurations against the budget each starts with.
+    Bracket s starts n = ceil((s_max + 1) / (s + 1) * eta**s) trials, taken
+    from blueprints, with budget max_budget / eta**s."""
+
+    def __init__(self,
+                 trial_fn,
+                 blueprints,
+                 min_budget=1,
+                 max_budget=27,
+                 eta=3,
+                 mode='min',
+                 processes=None,
+                 state_file=None):
+        self.state_file = state_file
+        state = None
+        if state_file and os.path.isfile(state_file):
+            state = _load_json(state_file)
+
+        self.mode = mode
+        self.brackets = []
+        s_max = 0
+        while min_budget * eta ** (s_max + 1) <= max_budget:
+            s_max += 1
+        blueprints = iter(blueprints)
+        for i, s in enumerate(range(s_max, -1, -1)):
+            n = int(math.ceil((s_max + 1) / (s + 1.) * eta ** s))
+            if state is not None:
+                if i >= len(state['brackets']):
+                    break
+                bracket_state, chunk = state['brackets'][i], None
+            else:
+                bracket_state, chunk = None, list(itertools.islice(blueprints,
+                                                                   n))
+                if not chunk:
+                    break
+            # rounded to an int by SuccessiveHalving
+            bracket_budget = max_budget / float(eta ** s)
+            self.brackets.append(SuccessiveHalving(
+                trial_fn,
+                chunk,
+                min_budget=bracket_budget,
+                max_budget=max_budget,
+                eta=eta,
+                mode=mode,
+                processes=processes,
+                state=bracket_state,
+                on_save=self.save))
+        self.save()
+
+    def save(self):
+        if self.state_file:
+            _save_json(self.state_file,
+                       {'brackets': [b.state() for b in self.brackets]})
+
+    def run(self):
+        """Run (or resume) all brackets, returns best (blueprint, metric)
+        among trials that reached max_budget."""
+        results = [bracket.run() for bracket in self.brackets]
+        results = [r for r in results if r[1] is not None]
+        if not results:
+            return None, None
+        pick = min if self.mode == 'min' else max
+        return pick(results, key=lambda r: r[1])
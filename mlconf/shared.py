@@ -0,0 +1,411 @@
+"""Read only Blueprints backed by a memory mapped file.
+
+A Blueprint is serialised once into a compact binary file (ideally on
+a tmpfs such as /dev/shm). Worker processes attach to it and decode nodes
+lazily when a dotted path is accessed - nothing is deserialised up front
+and all processes share the same pages of memory. Pickling a
+SharedBlueprint only sends the filename, the file id and an offset, so
+handing one to a multiprocessing pool is cheap regardless of the size of
+the config.
+
+    SharedBlueprint.dump(conf, '/dev/shm/conf.mlcb')
+    shared = SharedBlueprint.attach('/dev/shm/conf.mlcb')
+    pool.map(train, [shared] * 64)
+
+Layout (little endian). The header holds a random id of the file (so that
+pickled nodes can tell if the file was rewritten) and the offset of the
+root node, every node starts with a one byte tag:
+
+    header   : magic(4s) version(I) file id(Q) root(Q)
+    None     : 'N'
+    bool     : 'T' | 'F'
+    int      : 'I' value(q)
+    float    : 'D' value(d)
+    str      : 'S' length(I) utf-8 bytes
+    list     : 'L' count(I) offsets(count * Q)
+    tuple    : 'U' count(I) offsets(count * Q)
+    array    : 'A' typecode(c) count(I) packed values (homogeneous
+               int or float lists are packed instead of boxed)
+    mapping  : 'M' count(I) (key offset(Q), value offset(Q)) * count
+               keys point to str nodes, identical strings are stored once
+"""
+import os
+import mmap
+import struct
+from array import array
+
+from mlconf import Blueprint
+
+
+MAGIC = b'MLCB'
+VERSION = 2
+
+_HEADER = struct.Struct('<4sIQQ')
+_COUNT = struct.Struct('<I')
+_OFFSET = struct.Struct('<Q')
+_PAIR = struct.Struct('<QQ')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+# Lists shorter than this are stored as regular lists
+MIN_PACKED_LENGTH = 8
+
+# filename -> (mmap, stat of the mapped file), so that all nodes attached
+# in a process share a mapping
+_MAPPINGS = dict()
+
+
+class _Writer(object):
+
+    def __init__(self):
+        self.buf = bytearray(_HEADER.size)
+        self.strings = dict()
+
+    def _emit(self, data):
+        offset = len(self.buf)
+        self.buf.extend(data)
+        return offset
+
+    def write_str(self, s):
+        offset = self.strings.get(s)
+        if offset is None:
+            data = s.encode('utf-8')
+            offset = self._emit(b'S' + _COUNT.pack(len(data)) + data)
+            self.strings[s] = offset
+        return offset
+
+    def write(self, obj):
+        # children are written before parents so their offsets are known
+        if isinstance(obj, Blueprint):
+            obj = obj.as_dict()
+        if obj is None:
+            return self._emit(b'N')
+        elif obj is True:
+            return self._emit(b'T')
+        elif obj is False:
+            return self._emit(b'F')
+        elif isinstance(obj, int):
+            if not _INT_MIN <= obj <= _INT_MAX:
+                raise TypeError('Cannot store %d in a SharedBlueprint, ints '
+                                'need to fit in 64 bits' % obj)
+            return self._emit(b'I' + _INT.pack(obj))
+        elif isinstance(obj, float):
+            return self._emit(b'D' + _FLOAT.pack(obj))
+        elif isinstance(obj, str):
+            return self.write_str(obj)
+        elif isinstance(obj, dict):
+            pairs = []
+            for key, val in obj.items():
+                if not isinstance(key, str):
+                    raise TypeError('Only string keys are supported, got %r'
+                                    % key)
+                pairs.append(_PAIR.pack(self.write_str(key), self.write(val)))
+            return self._emit(b'M' + _COUNT.pack(len(pairs)) + b''.join(pairs))
+        elif isinstance(obj, (list, tuple)):
+            packed = self._pack(obj) if isinstance(obj, list) else None
+            if packed is not None:
+                return self._emit(packed)
+            tag = b'L' if isinstance(obj, list) else b'U'
+            offsets = [self.write(val) for val in obj]
+            return self._emit(tag + _COUNT.pack(len(offsets)) +
+                              b''.join(_OFFSET.pack(o) for o in offsets))
+        raise TypeError('Cannot store %r of type %s in a SharedBlueprint'
+                        % (obj, type(obj).__name__))
+
+    def _pack(self, l):
+        if len(l) < MIN_PACKED_LENGTH:
+            return None
+        types = set(type(e) for e in l)
+        if types == {float}:
+            typecode = 'd'
+        elif types == {int}:
+            typecode = 'q'
+        else:
+            return None
+        try:
+            values = array(typecode, l)
+        except OverflowError:
+            return None
+        if struct.pack('=I', 1) != _COUNT.pack(1):
+            values.byteswap()
+        return (b'A' + typecode.encode('ascii') + _COUNT.pack(len(l)) +
+                values.tobytes())
+
+
+def _file_id(buf):
+    return _HEADER.unpack_from(buf, 0)[2]
+
+
+def _stat_key(stat):
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _map(filename, file_id=None):
+    """Return the mapping of filename. If file_id is given the mapping
+    must be of the file with that id (ie. the file was not rewritten),
+    otherwise it is of the current file on disk."""
+    filename = os.path.abspath(filename)
+    cached = _MAPPINGS.get(filename)
+    if cached is not None:
+        buf, stat_key = cached
+        if file_id is not None:
+            if _file_id(buf) == file_id:
+                return filename, buf
+        elif _stat_key(os.stat(filename)) == stat_key:
+            return filename, buf
+    with open(filename, 'rb') as f:
+        stat_key = _stat_key(os.fstat(f.fileno()))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _, _ = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('%s is not a SharedBlueprint file' % filename)
+    if version != VERSION:
+        raise ValueError('%s has version %d, expected %d'
+                         % (filename, version, VERSION))
+    if file_id is not None and _file_id(buf) != file_id:
+        raise ValueError('%s was rewritten after this node was pickled, '
+                         'attach to the new file instead' % filename)
+    _MAPPINGS[filename] = (buf, stat_key)
+    return filename, buf
+
+
+def _attach(filename, offset=None, file_id=None):
+    filename, buf = _map(filename, file_id)
+    if offset is None:
+        offset = _HEADER.unpack_from(buf, 0)[3]
+    return _decode(filename, buf, offset)
+
+
+def _read_str(buf, offset):
+    length, = _COUNT.unpack_from(buf, offset + 1)
+    start = offset + 1 + _COUNT.size
+    return buf[start:start + length].decode('utf-8')
+
+
+def _decode(filename, buf, offset):
+    tag = buf[offset:offset + 1]
+    if tag == b'M':
+        return SharedBlueprint(filename, buf, offset)
+    elif tag in (b'L', b'U', b'A'):
+        return SharedList(filename, buf, offset)
+    elif tag == b'S':
+        return _read_str(buf, offset)
+    elif tag == b'I':
+        return _INT.unpack_from(buf, offset + 1)[0]
+    elif tag == b'D':
+        return _FLOAT.unpack_from(buf, offset + 1)[0]
+    elif tag == b'T':
+        return True
+    elif tag == b'F':
+        return False
+    elif tag == b'N':
+        return None
+    raise ValueError('Corrupt SharedBlueprint %s: unknown tag %r at %d'
+                     % (filename, tag, offset))
+
+
+def _to_builtin(obj):
+    if isinstance(obj, SharedBlueprint):
+        return obj.as_dict()
+    elif isinstance(obj, SharedList):
+        return obj.as_list()
+    return obj
+
+
+class SharedList(object):
+    """Read only sequence stored in a SharedBlueprint file."""
+
+    __slots__ = ('_filename', '_buf', '_offset', '_tag', '_len', '_typecode')
+
+    def __init__(self, filename, buf, offset):
+        self._filename = filename
+        self._buf = buf
+        self._offset = offset
+        self._tag = buf[offset:offset + 1]
+        if self._tag == b'A':
+            self._typecode = buf[offset + 1:offset + 2].decode('ascii')
+            self._len, = _COUNT.unpack_from(buf, offset + 2)
+        else:
+            self._typecode = None
+            self._len, = _COUNT.unpack_from(buf, offset + 1)
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._len))]
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError('SharedList index out of range')
+        if self._typecode is not None:
+            item = _FLOAT if self._typecode == 'd' else _INT
+            start = self._offset + 2 + _COUNT.size
+            return item.unpack_from(self._buf, start + idx * item.size)[0]
+        start = self._offset + 1 + _COUNT.size
+        offset, = _OFFSET.unpack_from(self._buf, start + idx * _OFFSET.size)
+        return _decode(self._filename, self._buf, offset)
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, SharedList):
+            other = other.as_list()
+        if isinstance(other, (list, tuple)):
+            return self.as_list() == list(other)
+        return False
+
+    def __reduce__(self):
+        return (_attach, (self._filename, self._offset,
+                          _file_id(self._buf)))
+
+    def __repr__(self):
+        return 'SharedList(%r)' % (self.as_list(),)
+
+    def as_list(self):
+        if self._typecode is not None:
+            start = self._offset + 2 + _COUNT.size
+            item = _FLOAT if self._typecode == 'd' else _INT
+            end = start + self._len * item.size
+            values = array(self._typecode, self._buf[start:end])
+            if struct.pack('=I', 1) != _COUNT.pack(1):
+                values.byteswap()
+            return values.tolist()
+        l = [_to_builtin(e) for e in self]
+        return tuple(l) if self._tag == b'U' else l
+
+
+class SharedBlueprint(object):
+    """Read only Blueprint whose contents live in a memory mapped file.
+
+    Supports the same dot access and dictionary interface as Blueprint
+    for reading. Each node decodes its keys the first time it is accessed,
+    values are decoded on every access, nested mappings are returned as
+    SharedBlueprint and sequences as SharedList."""
+
+    __slots__ = ('_filename', '_buf', '_offset', '_index')
+
+    def __init__(self, filename, buf, offset):
+        self._filename = filename
+        self._buf = buf
+        self._offset = offset
+        self._index = None
+
+    @staticmethod
+    def dump(obj, filename):
+        """Serialise a Blueprint (or dict) to filename. The file is written
+        to a temporary path and moved into place, so processes that are
+        attached to a previous version are unaffected."""
+        writer = _Writer()
+        root = writer.write(obj)
+        file_id, = _OFFSET.unpack(os.urandom(_OFFSET.size))
+        _HEADER.pack_into(writer.buf, 0, MAGIC, VERSION, file_id, root)
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(writer.buf)
+        os.replace(tmp, filename)
+        # a new file invalidates any mapping of the previous one
+        _MAPPINGS.pop(os.path.abspath(filename), None)
+        return filename
+
+    @staticmethod
+    def attach(filename):
+        """Map filename read only and return its root node."""
+        return _attach(filename)
+
+    def _get_index(self):
+        if self._index is None:
+            buf = self._buf
+            count, = _COUNT.unpack_from(buf, self._offset + 1)
+            start = self._offset + 1 + _COUNT.size
+            index = dict()
+            for i in range(count):
+                key_offset, val_offset = _PAIR.unpack_from(
+                    buf, start + i * _PAIR.size)
+                index[_read_str(buf, key_offset)] = val_offset
+            self._index = index
+        return self._index
+
+    def __getattr__(self, key):
+        if key.startswith('__') or key in SharedBlueprint.__slots__:
+            raise AttributeError(key)
+        try:
+            offset = self._get_index()[key]
+        except KeyError:
+            raise AttributeError('SharedBlueprint has no key %s' % key)
+        return _decode(self._filename, self._buf, offset)
+
+    def __setattr__(self, key, val):
+        if key in SharedBlueprint.__slots__:
+            return object.__setattr__(self, key, val)
+        raise AttributeError('SharedBlueprint is read only, cannot set %s'
+                             % key)
+
+    def __getitem__(self, key):
+        node = self
+        for part in key.split('.'):
+            if isinstance(node, SharedList) and part.isdigit():
+                node = node[int(part)]
+            elif isinstance(node, SharedBlueprint):
+                offset = node._get_index().get(part)
+                if offset is None:
+                    raise KeyError('Key: %s not found' % key)
+                node = _decode(node._filename, node._buf, offset)
+            else:
+                raise KeyError('Key: %s not found' % key)
+        return node
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            pass
+        return False
+
+    def __iter__(self):
+        return iter(self._get_index())
+
+    def __len__(self):
+        return len(self._get_index())
+
+    def __eq__(self, other):
+        if isinstance(other, (SharedBlueprint, Blueprint)):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __reduce__(self):
+        return (_attach, (self._filename, self._offset,
+                          _file_id(self._buf)))
+
+    def __repr__(self):
+        return 'Shared%r' % self.to_blueprint()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._get_index().keys()
+
+    def values(self):
+        return [getattr(self, key) for key in self._get_index()]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._get_index()]
+
+    def as_dict(self):
+        return dict((key, _to_builtin(val)) for key, val in self.items())
+
+    def as_flat_dict(self):
+        return Blueprint.to_path_dict(self.as_dict(), [], dict())
+
+    def to_blueprint(self):
+        """Fully deserialise into a regular (mutable) Blueprint."""
+        return Blueprint.from_dict(self.as_dict(), copy=False)
@@ -0,0 +1,148 @@
+import threading
+from copy import deepcopy
+from contextlib import contextmanager
+
+from mlconf import Blueprint
+
+
+class FrozenList(tuple):
+    """Tuple that was a list before freezing, thaw turns it back
+    into a list."""
+    __slots__ = ()
+
+
+class FrozenBlueprint(Blueprint):
+    """Read only Blueprint. Attributes cannot be set or deleted once the
+    object has been created and lists are converted to tuples, so
+    a FrozenBlueprint can be safely shared between threads without locking.
+
+    Use thaw to get a mutable Blueprint copy back, build always builds
+    a copy."""
+
+    READ_ONLY = True
+
+    def __init__(self, **kwargs):
+        # Bypass our own __setattr__ which refuses any assignment
+        for key, val in kwargs.items():
+            object.__setattr__(self, key, val)
+
+    def __setattr__(self, key, val):
+        raise AttributeError('FrozenBlueprint is read only, cannot set %s'
+                             % key)
+
+    def __delattr__(self, key):
+        raise AttributeError('FrozenBlueprint is read only, cannot delete %s'
+                             % key)
+
+    def __setstate__(self, state):
+        if self.__dict__:
+            raise AttributeError('FrozenBlueprint is read only, cannot '
+                                 'set its state')
+        super(FrozenBlueprint, self).__setstate__(state)
+
+    def build(self, copy=True, verbose=False):
+        """Build a copy, the snapshot is never modified (even if copy is
+        False)."""
+        return Blueprint.build_children(self.thaw(), verbose)
+
+    @classmethod
+    def _from_dict(cl, obj):
+        obj = super(FrozenBlueprint, cl)._from_dict(obj)
+        if isinstance(obj, list):
+            obj = FrozenList(obj)
+        return obj
+
+    @classmethod
+    def from_blueprint(cl, bp):
+        """Create a frozen copy of a Blueprint (or dict)."""
+        if isinstance(bp, FrozenBlueprint):
+            return bp
+        if isinstance(bp, Blueprint):
+            bp = bp.as_dict()
+        return cl.from_dict(bp)
+
+    @staticmethod
+    def _thaw(obj):
+        if isinstance(obj, FrozenBlueprint):
+            return dict((key, FrozenBlueprint._thaw(val))
+                        for key, val in obj.items())
+        elif isinstance(obj, FrozenList):
+            return [FrozenBlueprint._thaw(val) for val in obj]
+        elif isinstance(obj, tuple):
+            return tuple(FrozenBlueprint._thaw(val) for val in obj)
+        return deepcopy(obj)
+
+    def thaw(self):
+        """Return a mutable Blueprint copy of this snapshot, sequences
+        that were lists before freezing are lists again."""
+        return Blueprint.from_dict(FrozenBlueprint._thaw(self), copy=False)
+
+
+class BlueprintHolder(object):
+    """Publishes FrozenBlueprint snapshots to concurrent readers.
+
+    Readers grab the current snapshot without taking any lock - the
+    snapshot is never mutated, a new one is created on each update and
+    swapped in with a single reference assignment. Writers are serialised
+    and can batch any number of changes into a single publish.
+
+    Example:
+
+        holder = BlueprintHolder(Blueprint.from_file('conf.yaml'))
+
+        # readers (any thread)
+        lr = holder.snapshot.optimizer.lr
+
+        # writers
+        holder.update({'optimizer.lr': 0.01, 'model.dropout': 0.3})
+        with holder.edit() as draft:
+            draft.optimizer.lr = 0.001
+    """
+
+    def __init__(self, blueprint):
+        self._write_lock = threading.Lock()
+        # version and snapshot are swapped together so they are consistent
+        self._state = (0, FrozenBlueprint.from_blueprint(blueprint))
+
+    @property
+    def snapshot(self):
+        return self._state[1]
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    def __getitem__(self, key):
+        return self._state[1][key]
+
+    def get(self, key, default=None):
+        return self._state[1].get(key, default)
+
+    def _swap(self, blueprint):
+        snapshot = FrozenBlueprint.from_blueprint(blueprint)
+        version = self._state[0] + 1
+        # Assigning a reference is atomic, readers either see the old
+        # state or the new one, never a half applied update.
+        self._state = (version, snapshot)
+        return snapshot
+
+    def publish(self, blueprint):
+        """Replace the current snapshot with a frozen copy of blueprint."""
+        with self._write_lock:
+            return self._swap(blueprint)
+
+    def update(self, updates):
+        """Apply a dict of {dotted.path: value} updates and publish them
+        as a single new snapshot."""
+        with self.edit() as draft:
+            for key, val in updates.items():
+                draft[key] = val
+
+    @contextmanager
+    def edit(self):
+        """Yield a mutable copy of the current snapshot. The changes are
+        published when the block exits, or discarded if it raises."""
+        with self._write_lock:
+            draft = self._state[1].thaw()
+            yield draft
+            self._swap(draft)
@@ -12,6 +12,7 @@ setup(
       keywords='config argparse yaml machine-learning',
       install_requires=['pyyaml', 'argparse'],
       tests_require=['pytest'],
+      entry_points={'console_scripts': ['mlconf = mlconf.cli:main']},
       classifiers=['Development Status :: 3 - Alpha',
                    'Intended Audience :: Developers',
                    'License :: OSI Approved :: BSD License',
@@ -60,3 +60,92 @@ def test_yaml_loader_bools():
     assert(bp.foo.boolstuff.b == True)
     assert(bp.foo.boolstuff.c == False)
     assert(bp.foo.boolstuff.d == True)
+
+
+def test_yaml_grid_search():
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLGridSearchAction)
+    bp = parser.parse_args(['--load_blueprint', 'tests/data/example.yaml',
+                            '--foo.counter.a', '1', '2',
+                            '--foo.counter.b', '7', '8', '9'])
+    grid = [(b.foo.counter.a, b.foo.counter.b) for b in bp.grid_blueprints]
+    assert(grid == [(1, 7), (1, 8), (1, 9), (2, 7), (2, 8), (2, 9)])
+
+
+def test_env_overrides():
+    conf = {'model.lr': 0.1, 'model.layers': 2, 'model.bias': True}
+    environ = {'MLCONF__model__lr': '0.5',
+               'MLCONF__model__bias': 'false',
+               'HOME': '/root'}
+    overrides = mlconf.env_overrides(conf, environ)
+    assert(overrides == {'model.lr': 0.5, 'model.bias': False})
+    with pytest.warns(UserWarning):
+        assert(mlconf.env_overrides(conf, {'MLCONF__model__units': '3'}) ==
+               dict())
+    with pytest.raises(KeyError):
+        mlconf.env_overrides(conf, {'MLCONF__model__units': '3'},
+                             strict=True)
+    with pytest.raises(ValueError):
+        mlconf.env_overrides(conf, {'MLCONF__model__layers': 'many'})
+
+
+def test_env_overrides_ambiguous():
+    conf = {'a__b.c': 1, 'a.b__c': 2, 'd': 3}
+    assert(mlconf.env_overrides(conf, {'MLCONF__d': '4'}) == {'d': 4})
+    with pytest.raises(ValueError, match='a__b.c and a.b__c'):
+        mlconf.env_overrides(conf, {'MLCONF__a__b__c': '4'})
+
+
+def test_yaml_loader_env(monkeypatch):
+    monkeypatch.setenv('MLCONF__foo__counter__a', '10')
+    monkeypatch.setenv('MLCONF__foo__counter__b', '20')
+    monkeypatch.setenv('MLCONF__foo__boolstuff__c', 'yes')
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLLoaderAction)
+    # file < env < command line
+    bp = parser.parse_args(['--load_blueprint', 'tests/data/example.yaml',
+                            '--foo.counter.b', '63'])
+    assert(bp.foo.counter.a == 10)
+    assert(bp.foo.counter.b == 63)
+    assert(bp.foo.boolstuff.c == True)
+
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint', env_prefix=None,
+                        action=mlconf.YAMLLoaderAction)
+    bp = parser.parse_args(['--load_blueprint', 'tests/data/example.yaml'])
+    assert(bp.foo.counter.a == 5)
+
+
+def test_yaml_loader_env_unknown(monkeypatch):
+    # eg. meant for another script sharing the job environment
+    monkeypatch.setenv('MLCONF__foo__counter__z', '10')
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLLoaderAction)
+    with pytest.warns(UserWarning):
+        bp = parser.parse_args(['--load_blueprint',
+                                'tests/data/example.yaml'])
+    assert(bp.foo.counter.a == 5)
+
+
+def test_yaml_loader_env_bad_value(monkeypatch):
+    monkeypatch.setenv('MLCONF__foo__counter__a', 'many')
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLLoaderAction)
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--load_blueprint', 'tests/data/example.yaml'])
+
+
+def test_yaml_grid_search_env(monkeypatch):
+    monkeypatch.setenv('MLCONF__foo__counter__a', '4')
+    monkeypatch.setenv('MLCONF__foo__counter__b', '5')
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLGridSearchAction)
+    bp = parser.parse_args(['--load_blueprint', 'tests/data/example.yaml',
+                            '--foo.counter.b', '7', '8'])
+    grid = [(b.foo.counter.a, b.foo.counter.b) for b in bp.grid_blueprints]
+    assert(grid == [(4, 7), (4, 8)])
@@ -0,0 +1,50 @@
+import array
+import pickle
+from copy import deepcopy
+import mlconf
+
+
+def make_conf(tmp_path):
+    weights = array.array('d', [0.25, 0.5, 0.25])
+    with open(str(tmp_path / 'weights.bin'), 'wb') as f:
+        f.write(weights.tobytes())
+    filename = str(tmp_path / 'conf.yaml')
+    with open(filename, 'w') as f:
+        f.write('loss:\n  weights: !array weights.bin\n  name: ce\n')
+    return filename
+
+
+def test_array_ref_lazy_load(tmp_path):
+    bp = mlconf.Blueprint.from_file(make_conf(tmp_path))
+    ref = bp.loss.weights
+    assert(isinstance(ref, mlconf.ArrayRef))
+    assert(ref._data is None)
+    assert(list(ref.data.cast('d')) == [0.25, 0.5, 0.25])
+    assert(len(ref) == 3 * 8)
+
+
+def test_array_ref_copy_shares_reference(tmp_path):
+    bp = mlconf.Blueprint.from_file(make_conf(tmp_path))
+    copied = deepcopy(bp)
+    assert(copied.loss.weights is bp.loss.weights)
+    built = bp.build()
+    assert(built.loss.weights is bp.loss.weights)
+    pickled = pickle.loads(pickle.dumps(bp.loss.weights))
+    assert(pickled == bp.loss.weights)
+
+
+def test_array_ref_to_file(tmp_path):
+    src = tmp_path / 'a'
+    src.mkdir()
+    bp = mlconf.Blueprint.from_file(make_conf(src))
+    # written to another directory the reference still points to a/
+    out_dir = tmp_path / 'b'
+    out_dir.mkdir()
+    out = str(out_dir / 'conf.yaml')
+    bp.to_file(out)
+    with open(out) as f:
+        assert('!array' in f.read())
+    loaded = mlconf.Blueprint.from_file(out)
+    assert(loaded == bp)
+    assert(bytes(loaded.loss.weights.data) == bytes(bp.loss.weights.data))
+    assert('!array' in repr(bp))
@@ -1,4 +1,5 @@
 from collections import Counter
+from copy import deepcopy
 import yaml
 import mlconf
 
@@ -129,3 +130,71 @@ def test_load_order_preservation(tmp_path):
     bp = mlconf.Blueprint.from_file(filename)
     loaded_key_order = tuple(bp.as_dict().keys())
     assert key_order == loaded_key_order
+
+
+def test_repr_cached():
+    bp = mlconf.Blueprint.from_file('tests/data/example.yaml')
+    first = repr(bp)
+    assert(repr(bp) is first)
+    assert(str(bp) is first)
+
+
+def test_repr_invalidated_by_descendant():
+    bp = mlconf.Blueprint.from_dict({'a': {'b': {'c': 1}},
+                                     'l': [{'d': 1}]})
+    repr(bp)
+    child_repr = repr(bp.a)
+    bp['a.b.c'] = 2
+    assert('c: 2' in repr(bp))
+    assert('c: 2' in repr(bp.a))
+    assert(repr(bp.a) != child_repr)
+    bp.l[0].d = 5
+    assert('d: 5' in repr(bp))
+    del bp.a
+    assert('c: 2' not in repr(bp))
+
+
+def test_repr_invalidated_after_copy():
+    bp = mlconf.Blueprint.from_dict({'a': {'b': 1}})
+    repr(bp)
+    copied = deepcopy(bp)
+    copied.a.b = 3
+    assert('b: 3' in repr(copied))
+    assert('b: 1' in repr(bp))
+
+
+def test_repr_invalidated_by_shared_child():
+    child = mlconf.Blueprint(a=1)
+    first = mlconf.Blueprint(child=child)
+    second = mlconf.Blueprint(child=child)
+    repr(first)
+    repr(second)
+    child.a = 2
+    assert('a: 2' in repr(first))
+    assert('a: 2' in repr(second))
+
+
+def test_bookkeeping_names_are_entries():
+    d = {'_repr_cache': 'cached', '_path_index': 1, '_parents': 2, 'a': 1}
+    bp = mlconf.Blueprint.from_dict(d)
+    assert(bp.as_dict() == d)
+    assert(list(bp.keys()) == list(d.keys()))
+    assert(repr(bp).startswith('Blueprint:'))
+    assert(bp.select('_*') == {'_repr_cache': 'cached', '_path_index': 1,
+                               '_parents': 2})
+
+
+def test_repr_invalidated_by_build():
+    bp = mlconf.Blueprint.from_file('tests/data/example.yaml')
+    before = repr(bp)
+    bp.build(copy=False)
+    assert(repr(bp) != before)
+
+
+def test_summary():
+    bp = mlconf.Blueprint.from_dict({'a': {'b': {'c': 1}},
+                                     'l': list(range(100))})
+    summary = bp.summary(max_depth=2, max_items=3)
+    assert('<1 keys>' in summary)
+    assert('<97 more items>' in summary)
+    assert(bp.summary() == bp.summary(max_depth=3, max_items=10))
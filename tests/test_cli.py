@@ -0,0 +1,67 @@
+import os
+import json
+import mlconf
+from mlconf import cli
+
+
+def test_expand_jsonl(tmp_path):
+    out = str(tmp_path / 'grid.jsonl')
+    assert(cli.main(['expand', '--jsonl', out, 'tests/data/example.yaml',
+                     '--foo.counter.a', '1', '2', '3']) == 0)
+    with open(out) as f:
+        lines = [json.loads(line) for line in f]
+    assert([l['foo']['counter']['a'] for l in lines] == [1, 2, 3])
+    assert(lines[0]['foo']['counter']['b'] == 3)
+
+
+def test_expand_files(tmp_path):
+    out_dir = str(tmp_path / 'grid')
+    assert(cli.main(['expand', '--out-dir', out_dir, '--jobs', '2',
+                     'tests/data/include/experiment.yaml',
+                     'tests/data/include/override.yaml',
+                     '--model.units', '1', '2', '--seed', '3', '4']) == 0)
+    assert(sorted(os.listdir(out_dir)) == ['0000%d.yaml' % i
+                                           for i in range(4)])
+    bp = mlconf.Blueprint.from_file(os.path.join(out_dir, '00003.yaml'))
+    assert(bp.model.units == 2)
+    assert(bp.seed == 4)
+    assert(bp.dataset.batch_size == 64)
+
+
+def test_get(capsys):
+    assert(cli.main(['get', 'tests/data/example.yaml',
+                     'foo.counter.a', 'foo.boolstuff']) == 0)
+    out = capsys.readouterr().out
+    assert(out.startswith('5\n'))
+    assert('c: false' in out)
+    assert(cli.main(['get', 'tests/data/example.yaml', 'nope']) == 1)
+
+
+def test_flatten(capsys):
+    assert(cli.main(['flatten', '--format', 'json',
+                     'tests/data/example.yaml']) == 0)
+    flat = json.loads(capsys.readouterr().out)
+    assert(flat['foo.counter.a'] == 5)
+
+
+def test_diff(capsys, tmp_path):
+    filename = str(tmp_path / 'conf.yaml')
+    bp = mlconf.Blueprint.from_file('tests/data/example.yaml')
+    bp.foo.counter.a = 6
+    bp.to_file(filename)
+    assert(cli.main(['diff', 'tests/data/example.yaml', filename]) == 1)
+    out = capsys.readouterr().out
+    assert(out == '- foo.counter.a: 5\n+ foo.counter.a: 6\n')
+    assert(cli.main(['diff', filename, filename]) == 0)
+
+
+def test_expand_files_array_ref(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'w.bin').write_bytes(b'abc')
+    (src / 'conf.yaml').write_text('w: !array w.bin\nseed: 1\n')
+    out_dir = str(tmp_path / 'grid')
+    assert(cli.main(['expand', '--out-dir', out_dir,
+                     str(src / 'conf.yaml'), '--seed', '1', '2']) == 0)
+    bp = mlconf.Blueprint.from_file(os.path.join(out_dir, '00001.yaml'))
+    assert(bytes(bp.w.data) == b'abc')
@@ -0,0 +1,71 @@
+import mlconf
+import pytest
+
+
+def test_include():
+    d = mlconf.dict_from_file('tests/data/include/experiment.yaml')
+    assert(d == {'dataset': {'name': 'mnist',
+                             'batch_size': 32,
+                             'splits': ['train', 'dev']},
+                 'model': {'dropout': 0.1,
+                           'units': 200,
+                           'encoder': {'layers': 3, 'bidirectional': True}},
+                 'seed': 5})
+
+
+def test_include_key_order():
+    d = mlconf.dict_from_file('tests/data/include/experiment.yaml')
+    assert(list(d) == ['dataset', 'model', 'seed'])
+    assert(list(d['model']) == ['dropout', 'units', 'encoder'])
+
+
+def test_from_files():
+    bp = mlconf.Blueprint.from_files('tests/data/include/experiment.yaml',
+                                     'tests/data/include/override.yaml')
+    assert(bp.dataset.batch_size == 64)
+    assert(bp.dataset.name == 'mnist')
+    assert(bp.model.encoder.layers == 3)
+
+
+def test_fragment_cache_not_modified():
+    mlconf.clear_fragment_cache()
+    d = mlconf.dict_from_file('tests/data/include/experiment.yaml')
+    d['dataset']['splits'].append('test')
+    d['model']['encoder']['layers'] = 10
+    d = mlconf.dict_from_file('tests/data/include/experiment.yaml')
+    assert(d['dataset']['splits'] == ['train', 'dev'])
+    assert(d['model']['encoder']['layers'] == 3)
+    assert(len(mlconf._FRAGMENT_CACHE) == 3)
+
+
+def test_fragment_cache_reloads_changed_file(tmp_path):
+    filename = str(tmp_path / 'conf.yaml')
+    with open(filename, 'w') as f:
+        f.write('a: 1\n')
+    assert(mlconf.dict_from_file(filename) == {'a': 1})
+    with open(filename, 'w') as f:
+        f.write('a: 22\n')
+    assert(mlconf.dict_from_file(filename) == {'a': 22})
+
+
+def test_circular_include(tmp_path):
+    with open(str(tmp_path / 'a.yaml'), 'w') as f:
+        f.write('$include: b.yaml\n')
+    with open(str(tmp_path / 'b.yaml'), 'w') as f:
+        f.write('$include: a.yaml\n')
+    with pytest.raises(ValueError):
+        mlconf.dict_from_file(str(tmp_path / 'a.yaml'))
+
+
+def test_yaml_loader_multiple_files():
+    parser = mlconf.ArgumentParser()
+    parser.add_argument('--load_blueprint',
+                        action=mlconf.YAMLLoaderAction)
+    bp = parser.parse_args(['--load_blueprint',
+                            'tests/data/include/experiment.yaml',
+                            'tests/data/include/override.yaml',
+                            '--model.units', '7'])
+    assert(bp.dataset.batch_size == 64)
+    assert(bp.model.units == 7)
+    assert(bp.load_blueprint == ['tests/data/include/experiment.yaml',
+                                 'tests/data/include/override.yaml'])
@@ -0,0 +1,163 @@
+import json
+import fractions
+import pytest
+import mlconf
+
+
+def quadratic(trial):
+    # loss goes down with budget, best x is 3
+    x = trial.blueprint.x
+    for step in range(1, trial.budget + 1):
+        yield (x - 3) ** 2 + 1. / step
+
+
+def failing(trial):
+    if trial.blueprint.x == 3:
+        raise RuntimeError('diverged')
+    return abs(trial.blueprint.x - 2)
+
+
+class Scalar(object):
+    # like a 0-d numpy array or tensor: has a float value, can't be iterated
+    ndim = 0
+
+    def __init__(self, value):
+        self.value = value
+
+    def __float__(self):
+        return float(self.value)
+
+    def __iter__(self):
+        raise TypeError('iteration over a 0-d array')
+
+
+def grid(n):
+    return [mlconf.Blueprint.from_dict({'x': x}) for x in range(n)]
+
+
+def test_successive_halving():
+    calls = []
+
+    def record(trial):
+        calls.append((trial.blueprint.x, trial.budget))
+        return list(quadratic(trial))
+
+    sh = mlconf.SuccessiveHalving(record, grid(9), min_budget=1,
+                                  max_budget=9, eta=3, processes=1)
+    assert(sh.budgets == [1, 3, 9])
+    bp, metric = sh.run()
+    assert(bp.x == 3)
+    assert(metric == pytest.approx(1. / 9))
+    # 9 trials at budget 1, 3 at budget 3 and 1 at budget 9
+    assert(len(calls) == 13)
+    assert([x for x, b in calls if b == 9] == [3])
+
+
+def test_successive_halving_max_mode():
+    sh = mlconf.SuccessiveHalving(lambda t: t.blueprint.x, grid(4),
+                                  min_budget=1, max_budget=4, eta=2,
+                                  mode='max', processes=1)
+    bp, metric = sh.run()
+    assert(bp.x == 3)
+
+
+def test_failed_trials_not_promoted():
+    sh = mlconf.SuccessiveHalving(failing, grid(6), min_budget=1,
+                                  max_budget=4, eta=2, processes=1)
+    with pytest.warns(RuntimeWarning):
+        bp, metric = sh.run()
+    assert(bp.x == 2)
+    assert(sh.trials[3]['error'] == 'RuntimeError: diverged')
+
+
+def test_resume(tmp_path):
+    state_file = str(tmp_path / 'sweep.json')
+    sh = mlconf.SuccessiveHalving(quadratic, grid(9), min_budget=1,
+                                  max_budget=9, eta=3, processes=1,
+                                  state_file=state_file)
+    # only run the first rung, as if we were interrupted
+    sh._run_rung(0, 1)
+    with open(state_file) as f:
+        assert(len(json.load(f)['trials']) == 9)
+
+    calls = []
+
+    def record(trial):
+        calls.append(trial.budget)
+        return list(quadratic(trial))
+
+    # the blueprints passed are ignored when resuming
+    sh = mlconf.SuccessiveHalving(record, [], min_budget=1, max_budget=9,
+                                  eta=3, processes=1, state_file=state_file)
+    bp, metric = sh.run()
+    assert(bp.x == 3)
+    assert(calls == [3, 3, 3, 9])
+
+    with pytest.raises(ValueError):
+        mlconf.SuccessiveHalving(record, [], min_budget=1, max_budget=9,
+                                 eta=2, processes=1, state_file=state_file)
+
+
+def test_pool():
+    sh = mlconf.SuccessiveHalving(quadratic, grid(9), min_budget=1,
+                                  max_budget=9, eta=3, processes=2)
+    bp, metric = sh.run()
+    assert(bp.x == 3)
+
+
+def test_hyperband(tmp_path):
+    state_file = str(tmp_path / 'hb.json')
+    hb = mlconf.Hyperband(quadratic, iter(grid(100)), min_budget=1,
+                          max_budget=9, eta=3, processes=1,
+                          state_file=state_file)
+    assert([len(b.trials) for b in hb.brackets] == [9, 5, 3])
+    assert([b.budgets for b in hb.brackets] == [[1, 3, 9], [3, 9], [9]])
+    bp, metric = hb.run()
+    assert(bp.x == 3)
+    resumed = mlconf.Hyperband(quadratic, [], min_budget=1, max_budget=9,
+                               eta=3, processes=1, state_file=state_file)
+    assert(resumed.run()[0].x == 3)
+
+
+def test_hyperband_int_budgets():
+    hb = mlconf.Hyperband(quadratic, iter(grid(100)), min_budget=1,
+                          max_budget=10, eta=3, processes=1)
+    assert([b.budgets for b in hb.brackets] == [[1, 3, 10], [3, 10], [10]])
+    bp, metric = hb.run()
+    assert(bp.x == 3)
+    assert(not any(t['error'] for b in hb.brackets for t in b.trials))
+
+
+def test_scalar_like_results():
+    def fraction(trial):
+        return fractions.Fraction(abs(trial.blueprint.x - 2), 3)
+
+    def zero_dim(trial):
+        return Scalar(abs(trial.blueprint.x - 2))
+
+    for fn in (fraction, zero_dim):
+        sh = mlconf.SuccessiveHalving(fn, grid(4), min_budget=1,
+                                      max_budget=2, eta=2, processes=1)
+        bp, metric = sh.run()
+        assert(bp.x == 2)
+        assert(metric == 0.)
+
+
+def test_state_file_array_refs(tmp_path):
+    state_file = str(tmp_path / 'sweep.json')
+    weights = mlconf.ArrayRef('w.bin', base=str(tmp_path))
+    bps = [mlconf.Blueprint.from_dict({'x': x, 'w': weights})
+           for x in range(4)]
+    sh = mlconf.SuccessiveHalving(failing, bps, min_budget=1, max_budget=2,
+                                  eta=2, processes=1, state_file=state_file)
+    with open(state_file) as f:
+        assert(json.load(f)['trials'][0]['blueprint']['w'] ==
+               {'!array': 'w.bin'})
+    sh = mlconf.SuccessiveHalving(failing, [], min_budget=1, max_budget=2,
+                                  eta=2, processes=1, state_file=state_file)
+    assert(sh.trials[0]['blueprint']['w'] == weights)
+
+    bps = [mlconf.Blueprint.from_dict({'x': {1, 2}})]
+    with pytest.raises(TypeError, match='set'):
+        mlconf.SuccessiveHalving(failing, bps,
+                                 state_file=str(tmp_path / 'sets.json'))
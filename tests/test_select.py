@@ -0,0 +1,115 @@
+import pytest
+import mlconf
+
+
+data = {'model': {'encoder': {'dropout': 0.1, 'units': 10, 'lr': 0.1},
+                  'decoder': {'dropout': 0.2, 'units': 20},
+                  'layers': [{'dropout': 0.3}, {'dropout': 0.4}]},
+        'optimizer': {'lr': 0.01},
+        'lr': 1.}
+
+
+def test_select_single_wildcard():
+    bp = mlconf.Blueprint.from_dict(data)
+    assert(bp.select('model.*.dropout') == {'model.encoder.dropout': 0.1,
+                                            'model.decoder.dropout': 0.2})
+    assert(bp.select('model.layers.*.dropout') ==
+           {'model.layers.0.dropout': 0.3, 'model.layers.1.dropout': 0.4})
+    assert(bp.select('model.layers.1') == {'model.layers.1':
+                                           bp.model.layers[1]})
+
+
+def test_select_double_wildcard():
+    bp = mlconf.Blueprint.from_dict(data)
+    assert(list(bp.select('**.lr')) == ['model.encoder.lr',
+                                        'optimizer.lr',
+                                        'lr'])
+    assert(list(bp.select('**.dropout')) == ['model.encoder.dropout',
+                                             'model.decoder.dropout',
+                                             'model.layers.0.dropout',
+                                             'model.layers.1.dropout'])
+    assert(list(bp.select('model.**.units')) == ['model.encoder.units',
+                                                 'model.decoder.units'])
+
+
+def test_select_partial_key():
+    bp = mlconf.Blueprint.from_dict(data)
+    assert(list(bp.select('model.*coder.units')) == ['model.encoder.units',
+                                                     'model.decoder.units'])
+    assert(list(bp.select('model.?ncoder')) == ['model.encoder'])
+    assert(bp.select('nothing.*') == {})
+
+
+def test_update():
+    bp = mlconf.Blueprint.from_dict(data)
+    repr(bp)
+    assert(bp.update('**.dropout', 0.5) == 4)
+    assert(bp.model.encoder.dropout == 0.5)
+    assert(bp.model.layers[1].dropout == 0.5)
+    assert('dropout: 0.1' not in repr(bp))
+    assert(set(bp.select('**.dropout').values()) == {0.5})
+
+
+def test_update_list_index():
+    bp = mlconf.Blueprint.from_dict({'a': [1, 2, 3], 'b': {'c': [4, 5]}})
+    bp.select('**')
+    assert(bp.update('**.1', 0) == 2)
+    assert(bp.a == [1, 0, 3])
+    assert(bp.b.c == [4, 0])
+    assert(bp.select('b.c.*') == {'b.c.0': 4, 'b.c.1': 0})
+
+
+def test_update_tuple():
+    bp = mlconf.Blueprint.from_dict({'a': (1, 2)})
+    with pytest.raises(TypeError):
+        bp.update('a.0', 5)
+
+
+def test_update_nested_matches():
+    bp = mlconf.Blueprint.from_dict({'a': {'b': {'c': 1}}, 'd': 1})
+    # entries below a replaced entry are gone, they don't count
+    assert(bp.update('a.**', 0) == 1)
+    assert(bp.a.b == 0)
+    assert(bp.d == 1)
+
+
+def test_trailing_double_wildcard():
+    bp = mlconf.Blueprint.from_dict(data)
+    # a trailing ** matches below model, but not model itself
+    assert('model' not in bp.select('model.**'))
+    assert('model.layers.0.dropout' in bp.select('model.**'))
+    assert(bp.select('optimizer.**') == {'optimizer.lr': 0.01})
+    assert(bp.select('**.optimizer.lr') == {'optimizer.lr': 0.01})
+
+
+def test_update_copies_value():
+    bp = mlconf.Blueprint.from_dict({'a': {'l': [1]}, 'b': {'l': [2]}})
+    assert(bp.update('*.l', []) == 2)
+    bp.a.l.append(1)
+    assert(bp.b.l == [])
+
+
+def test_update_tuple_not_applied():
+    bp = mlconf.Blueprint.from_dict({'x': [1], 'y': (1, 2)})
+    with pytest.raises(TypeError):
+        bp.update('*.0', 5)
+    assert(bp.x == [1])
+
+
+def test_index_invalidated():
+    bp = mlconf.Blueprint.from_dict(data)
+    assert(len(bp.select('**.lr')) == 3)
+    bp.model.decoder.lr = 5
+    assert(len(bp.select('**.lr')) == 4)
+
+
+def test_index_sees_list_changes():
+    bp = mlconf.Blueprint.from_dict({'l': [1, 2], 'm': [{'x': 1}]})
+    assert(bp.select('l.*') == {'l.0': 1, 'l.1': 2})
+    bp.l[0] = 5
+    bp.l.append(9)
+    assert(bp.select('l.*') == {'l.0': 5, 'l.1': 2, 'l.2': 9})
+    assert(bp.select('m.*.x') == {'m.0.x': 1})
+    bp.m[0] = mlconf.Blueprint(x=7)
+    assert(bp.update('m.*.x', 100) == 1)
+    assert(bp.m[0].x == 100)
@@ -0,0 +1,102 @@
+import os
+import sys
+import pickle
+import subprocess
+import operator
+import multiprocessing
+import pytest
+import mlconf
+
+
+data = {'model': {'layers': [{'units': 10, 'dropout': 0.5},
+                             {'units': 20, 'dropout': None}],
+                  'name': 'mlp',
+                  'shape': (3, 4)},
+        'weights': [0.5] * 100,
+        'ids': list(range(50)),
+        'mixed': [1, 'a', True],
+        'flag': False}
+
+
+@pytest.fixture
+def shared(tmp_path):
+    filename = str(tmp_path / 'conf.mlcb')
+    mlconf.SharedBlueprint.dump(mlconf.Blueprint.from_dict(data), filename)
+    return mlconf.SharedBlueprint.attach(filename)
+
+
+def test_shared_access(shared):
+    assert(shared.model.name == 'mlp')
+    assert(shared['model.layers.1.units'] == 20)
+    assert(shared.model.layers[0].dropout == 0.5)
+    assert(shared['model.layers.1.dropout'] is None)
+    assert(shared.flag is False)
+    assert(shared.weights[99] == 0.5)
+    assert(shared.ids[-1] == 49)
+    assert(len(shared.ids) == 50)
+    assert(list(shared.keys()) == list(data.keys()))
+    assert('model.layers.0.units' in shared)
+    assert('model.nope' not in shared)
+    with pytest.raises(KeyError):
+        shared['model.nope']
+
+
+def test_shared_as_dict(shared):
+    assert(shared.as_dict() == data)
+    assert(shared == data)
+    assert(shared.to_blueprint() == mlconf.Blueprint.from_dict(data))
+
+
+def test_shared_read_only(shared):
+    with pytest.raises(AttributeError):
+        shared.flag = True
+
+
+def test_shared_pickle_is_small(shared):
+    pickled = pickle.dumps(shared.model)
+    assert(len(pickled) < 200)
+    assert(pickle.loads(pickled).layers[1].units == 20)
+
+
+def test_shared_pool(shared):
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(2) as pool:
+        units = pool.map(operator.itemgetter('model.layers.1.units'),
+                         [shared] * 4)
+    assert(units == [20] * 4)
+
+
+def test_shared_unsupported_type(tmp_path):
+    with pytest.raises(TypeError):
+        mlconf.SharedBlueprint.dump({'a': object()},
+                                    str(tmp_path / 'conf.mlcb'))
+
+
+def test_shared_int_out_of_range(tmp_path):
+    with pytest.raises(TypeError):
+        mlconf.SharedBlueprint.dump({'a': 2 ** 64},
+                                    str(tmp_path / 'conf.mlcb'))
+
+
+def test_shared_pickle_after_rewrite(tmp_path):
+    filename = str(tmp_path / 'conf.mlcb')
+    mlconf.SharedBlueprint.dump(data, filename)
+    pickled = pickle.dumps(mlconf.SharedBlueprint.attach(filename).model)
+    # still resolves against the old file while it is mapped
+    assert(pickle.loads(pickled).name == 'mlp')
+    mlconf.SharedBlueprint.dump({'d': {'e': 'x' * 100}}, filename)
+    with pytest.raises(ValueError) as e:
+        pickle.loads(pickled)
+    assert('rewritten' in str(e.value))
+
+
+def test_shared_attach_after_rewrite_by_other_process(tmp_path):
+    filename = str(tmp_path / 'conf.mlcb')
+    mlconf.SharedBlueprint.dump({'a': 1}, filename)
+    assert(mlconf.SharedBlueprint.attach(filename).a == 1)
+    # another process rewrites the file, our mapping is now stale
+    code = ('import mlconf; mlconf.SharedBlueprint.dump({"a": 2}, %r)'
+            % filename)
+    subprocess.check_call([sys.executable, '-c', code],
+                          cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert(mlconf.SharedBlueprint.attach(filename).a == 2)
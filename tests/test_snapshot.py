@@ -0,0 +1,106 @@
+import threading
+import collections
+import pytest
+import mlconf
+
+
+def test_frozen_read_only():
+    bp = mlconf.FrozenBlueprint.from_blueprint(
+        mlconf.Blueprint.from_file('tests/data/example.yaml'))
+    assert(bp.foo.counter.a == 5)
+    with pytest.raises(AttributeError):
+        bp.foo.counter.a = 3
+    with pytest.raises(AttributeError):
+        bp['threshold'] = 3
+
+
+def test_frozen_lists_become_tuples():
+    bp = mlconf.FrozenBlueprint.from_blueprint({'a': [1, {'b': [2]}]})
+    assert(bp.a[0] == 1)
+    assert(isinstance(bp.a, tuple))
+    assert(isinstance(bp.a[1], mlconf.FrozenBlueprint))
+    assert(bp.as_dict() == {'a': (1, {'b': (2,)})})
+
+
+def test_thaw():
+    bp = mlconf.FrozenBlueprint.from_blueprint({'a': {'b': 1}})
+    thawed = bp.thaw()
+    thawed['a.b'] = 2
+    assert(thawed.a.b == 2)
+    assert(bp.a.b == 1)
+
+
+def test_holder_batch_update():
+    holder = mlconf.BlueprintHolder(
+        mlconf.Blueprint.from_file('tests/data/example.yaml'))
+    old = holder.snapshot
+    holder.update({'foo.counter.a': 10, 'foo.counter.b': 20})
+    assert(holder.version == 1)
+    assert(holder['foo.counter.a'] == 10)
+    assert(holder.snapshot.foo.counter.b == 20)
+    # Readers holding the previous snapshot are unaffected
+    assert(old.foo.counter.a == 5)
+
+
+def test_holder_edit_discarded_on_error():
+    holder = mlconf.BlueprintHolder({'a': 1})
+    with pytest.raises(ValueError):
+        with holder.edit() as draft:
+            draft.a = 2
+            raise ValueError()
+    assert(holder.snapshot.a == 1)
+    assert(holder.version == 0)
+
+
+def test_holder_concurrent_updates_consistent():
+    holder = mlconf.BlueprintHolder({'x': 0, 'y': 0})
+    seen_inconsistent = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            snap = holder.snapshot
+            if snap.x != snap.y:
+                seen_inconsistent.append((snap.x, snap.y))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(1, 200):
+        holder.update({'x': i, 'y': i})
+    done.set()
+    for t in threads:
+        t.join()
+    assert(not seen_inconsistent)
+    assert(holder.snapshot.x == 199)
+
+
+def test_holder_edit_lists():
+    holder = mlconf.BlueprintHolder({'l': [1, 2], 't': (1, 2),
+                                     'a': {'l': [{'b': [3]}]}})
+    with holder.edit() as draft:
+        draft.l.append(3)
+        draft.a.l[0].b.append(4)
+        assert(isinstance(draft.t, tuple))
+    assert(holder.snapshot.l == (1, 2, 3))
+    assert(holder.snapshot.a.l[0].b == (3, 4))
+    # lists survive any number of edit/publish cycles
+    with holder.edit() as draft:
+        draft.l.append(4)
+    assert(holder.snapshot.thaw().l == [1, 2, 3, 4])
+
+
+def test_frozen_build_never_in_place():
+    holder = mlconf.BlueprintHolder(
+        mlconf.Blueprint.from_file('tests/data/example.yaml'))
+    snapshot = holder.snapshot
+    built = snapshot.build(copy=False)
+    assert(isinstance(built.foo.counter, collections.Counter))
+    assert(isinstance(snapshot.foo.counter, mlconf.FrozenBlueprint))
+    # a frozen Blueprint inside a regular one is not built in place either
+    bp = mlconf.Blueprint(snap=snapshot)
+    bp.build(copy=False)
+    assert(isinstance(bp.snap.foo.counter, collections.Counter))
+    assert(isinstance(snapshot.foo.counter, mlconf.FrozenBlueprint))
+    with pytest.raises(AttributeError):
+        snapshot.__setstate__({'foo': 1})